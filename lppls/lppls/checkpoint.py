@@ -0,0 +1,115 @@
+import io
+import os
+import uuid
+import zipfile
+import numpy as np
+
+from .fit_cache import FitCache
+from .nested_fits import FIT_DTYPE
+
+
+class FitCheckpoint(object):
+    """
+    Checkpoint file of a single, possibly long, nested-fit run.
+
+    The outer windows fitted so far are written to one npz file every `every` windows (and when the run stops
+    on an error), so a killed or failed run can be started again with the same checkpoint and only fits the
+    windows that are missing. The file records a key of the observations and fit settings, a checkpoint of a
+    different run is refused instead of being silently mixed in.
+    """
+
+    def __init__(self, path, every=10):
+        """
+        Args:
+            path (str): the checkpoint file, e.g. "backfill_spx.npz". Its directory must exist.
+            every (int): write the file once this many new windows are done
+        """
+        assert every >= 1, f"Expected every >= 1, got :{every}"
+        self.path = path
+        self.every = every
+        self._key = None
+        self._windows = {}
+        self._pending = 0
+
+    def open(self, observations, settings):
+        """
+        Binds the checkpoint to a run and reads back the windows it already completed.
+        Args:
+            observations (np.ndarray): 2xM matrix of the whole run
+            settings (dict): everything else the fits depend on, see fit_cache.FitCache.key
+        Returns:
+            (dict) start index of the outer window -> (t1, t2, p2, fits) of the completed windows
+        """
+        self._key = FitCache.key(observations, settings)
+        self._windows = {}
+        self._pending = 0
+        try:
+            with np.load(self.path) as entry:
+                key = entry["key"].item()
+                starts = entry["starts"]
+                windows = entry["windows"]
+                fits = entry["fits"]
+        except FileNotFoundError:
+            return {}
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            raise ValueError(f"Unreadable checkpoint {self.path}: {e}")
+        if key != self._key or fits.dtype != FIT_DTYPE:
+            raise ValueError(
+                f"The checkpoint {self.path} was written by a run with other observations or settings"
+            )
+
+        for i, window, fit in zip(starts.tolist(), windows, fits):
+            self._windows[i] = (window[0].item(), window[1].item(), window[2].item(), fit)
+        return dict(self._windows)
+
+    def add(self, start, window):
+        """
+        Records a completed outer window, and writes the file every `every` windows.
+        Args:
+            start (int): start index of the outer window
+            window (tuple): (t1, t2, p2, fits) as returned by LPPLS._func_compute_nested_fits_array
+        """
+        assert self._key is not None, "Call open before adding windows"
+        self._windows[start] = window
+        self._pending += 1
+        if self._pending >= self.every:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the completed windows that are not yet on disk.
+        """
+        if self._key is None or self._pending == 0:
+            return
+        starts = sorted(self._windows)
+        windows = [self._windows[i] for i in starts]
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            key=np.array(self._key),
+            starts=np.array(starts, dtype=np.int64),
+            windows=np.array([w[:3] for w in windows], dtype=np.float64).reshape(-1, 3),
+            fits=np.stack([np.asarray(w[3], dtype=FIT_DTYPE) for w in windows])
+            if windows
+            else np.empty((0, 0), dtype=FIT_DTYPE),
+        )
+
+        # write then rename, a run killed while writing leaves the previous checkpoint intact
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+    def remove(self):
+        """
+        Deletes the checkpoint file, e.g. once the run it belongs to has completed.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._pending = 0
+
+    def __len__(self):
+        return len(self._windows)
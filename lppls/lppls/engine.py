@@ -0,0 +1,152 @@
+from collections import OrderedDict
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from numba.np.ufunc import parallel
+import numpy as np
+
+# models rebuilt in a worker process, keyed by job id, see _get_job_model
+_jobs = OrderedDict()
+# how many models (and shared memory attachments) a worker keeps around
+MAX_CACHED_JOBS = 8
+
+
+def _get_start_method():
+    """
+    The start method of the worker processes: the default of the platform ("fork" on Linux), unless the parallel
+    numba kernels have started their threading layer in this process. A forked child inherits the state of those
+    threads (TBB in particular) and the pool then hangs at shutdown, so the workers are started fresh instead.
+    Returns:
+        (str) None for the default, else "forkserver" or "spawn" where forkserver isn't available
+    """
+    if not parallel._is_initialized:
+        return None
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _init_worker(warmup):
+    if warmup:
+        # lppls imports this module, import it here to avoid the cycle
+        from .lppls import LPPLS
+        LPPLS.warmup()
+
+
+def _get_job_model(job):
+    """
+    Args:
+        job (tuple): (job_id, model_cls, state, shm_spec) where state holds the model attributes without
+            the observations and shm_spec is None or (shm_name, shape, dtype) of observations in shared memory.
+    Returns:
+        the model of the job, rebuilt once per worker
+    """
+    job_id, model_cls, state, shm_spec = job
+    if job_id in _jobs:
+        _jobs.move_to_end(job_id)
+        return _jobs[job_id][0]
+
+    model = model_cls.__new__(model_cls)
+    model.__dict__.update(state)
+    shm = None
+    if shm_spec is not None:
+        shm_name, shape, dtype = shm_spec
+        # the workers share the parent's resource tracker, which unlinks the block if the parent dies
+        shm = SharedMemory(name=shm_name)
+        model.observations = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _jobs[job_id] = (model, shm)
+
+    while len(_jobs) > MAX_CACHED_JOBS:
+        old_model, old_shm = _jobs.popitem(last=False)[1]
+        if old_shm is not None:
+            old_model.observations = None
+            old_shm.close()
+    return model
+
+
+def _with_observations(model, args):
+    """
+    Replaces the (start, stop) window bounds of a task by the observations of that window.
+    """
+    (start, stop), *rest = args
+    return (model.observations[:, start:stop], *rest)
+
+
+def _run_task(task):
+    """
+    Runs method(args) on the model of a job, see _get_job_model. Jobs with observations in shared memory
+    carry window bounds instead of the window observations.
+    """
+    job, method, args = task
+    model = _get_job_model(job)
+    if job[3] is not None:
+        if isinstance(args, list):
+            args = [_with_observations(model, a) for a in args]
+        else:
+            args = _with_observations(model, args)
+    return getattr(model, method)(args)
+
+
+def _run_tagged_task(tagged_task):
+    """
+    _run_task for (tag, task) pairs, returns (tag, result) so results can be matched when they arrive unordered.
+    """
+    tag, task = tagged_task
+    return tag, _run_task(task)
+
+
+class LPPLSEngine(object):
+    """
+    Long-lived pool of worker processes that can run the nested fits of many LPPLS models.
+
+    The workers are started (and the compiled kernels warmed up in each of them) once, instead of once per
+    mp_compute_nested_fits call. Once the calling process has run the parallel numba kernels they are started fresh
+    rather than forked, see _get_start_method, and the models and their classes must then be importable by the
+    workers. Use it as a context manager:
+
+        with LPPLSEngine(workers=4) as engine:
+            for model in models:
+                res = engine.compute_nested_fits(model, window_size=120, smallest_window_size=30)
+    """
+
+    def __init__(self, workers=None, warmup=True):
+        """
+        Args:
+            workers (int): number of worker processes. Optional, defaults to os.cpu_count()
+            warmup (bool): compile the kernels in every worker when it starts
+        """
+        context = multiprocessing.get_context(_get_start_method())
+        self._pool = context.Pool(processes=workers, initializer=_init_worker, initargs=(warmup,))
+        self.workers = self._pool._processes
+
+    def imap(self, func, iterable, chunksize=1):
+        return self._pool.imap(func, iterable, chunksize)
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return self._pool.imap_unordered(func, iterable, chunksize)
+
+    def compute_nested_fits(self, model, **kwargs):
+        """
+        Runs model.mp_compute_nested_fits on the engine workers.
+        Args:
+            model (LPPLS): the model to fit, any LPPLS subclass
+            kwargs: see LPPLS.mp_compute_nested_fits
+        """
+        return model.mp_compute_nested_fits(workers=self.workers, engine=self, **kwargs)
+
+    def close(self):
+        """
+        Lets the workers finish their tasks and shuts the pool down.
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,152 @@
+import hashlib
+import io
+import json
+import os
+import uuid
+import zipfile
+import numpy as np
+
+from .nested_fits import FIT_DTYPE
+
+
+class FitCache(object):
+    """
+    Content-addressed on-disk cache of the nested fits of single outer windows.
+
+    An entry is keyed by a hash of the window's observations and of the fit settings, so a window whose
+    data didn't change (e.g. every window but the newest ones of a daily run) is read back instead of
+    fitted again. Entries are evicted least recently used first once the cache grows beyond max_bytes.
+    """
+
+    SUFFIX = ".npz"
+    # part of every key, bump it when the stored fits or the way they are computed change so old entries miss
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        Args:
+            directory (str): where the entries are stored, created if missing. Can be shared between runs
+                and processes.
+            max_bytes (int): size limit of the entries in directory
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._nbytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def key(observations, settings):
+        """
+        Args:
+            observations (np.ndarray): 2xM matrix of the outer window
+            settings (dict): everything else the fits depend on, e.g. the nested window sizes, minimizer,
+                max_searches and seed. Values must be JSON serializable (others are hashed by their repr).
+        Returns:
+            (str) hex digest identifying the fits of the window
+        """
+        observations = np.ascontiguousarray(observations, dtype=np.float64)
+        digest = hashlib.sha256()
+        digest.update(repr(FitCache.FORMAT_VERSION).encode())
+        digest.update(repr(observations.shape).encode())
+        digest.update(observations.tobytes())
+        digest.update(json.dumps(settings, sort_keys=True, default=repr).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns:
+            (t1, t2, p2, fits) as returned by LPPLS._func_compute_nested_fits_array, or None if key isn't cached
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                window = entry["window"]
+                fits = entry["fits"]
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        if fits.dtype != FIT_DTYPE:
+            return None
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return window[0].item(), window[1].item(), window[2].item(), fits
+
+    def put(self, key, window):
+        """
+        Args:
+            key (str): see FitCache.key
+            window (tuple): (t1, t2, p2, fits) as returned by LPPLS._func_compute_nested_fits_array
+        """
+        t1, t2, p2, fits = window
+        buffer = io.BytesIO()
+        np.savez(buffer, window=np.array([t1, t2, p2], dtype=np.float64), fits=np.asarray(fits, dtype=FIT_DTYPE))
+        data = buffer.getvalue()
+
+        # write then rename, so concurrent readers never see a partial entry
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._nbytes += len(data)
+        if self._nbytes > self.max_bytes:
+            self._evict()
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        for path, _, _ in self._entries():
+            self._remove(path)
+        self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _entries(self):
+        """
+        Yields:
+            (path, mtime, size) of every entry
+        """
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._nbytes = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._nbytes <= self.max_bytes:
+                break
+            # an entry removed concurrently by another process is gone all the same
+            self._remove(path)
+            self._nbytes -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,976 @@
+"""
+Compiled kernels shared by the LPPLS estimators.
+
+Everything in this module is written for numba's nopython mode so the kernels can be called from
+Python (e.g. as a scipy objective) as well as from other compiled code. The kernels are cached on disk
+(next to this file, or in NUMBA_CACHE_DIR if it isn't writable), so only the first process compiles them.
+"""
+import numpy as np
+from numba import njit, prange
+
+# Numba keys its on-disk cache by source file, not by module name, and an entry compiled under one module name fails
+# to load under another. Only the package installed by setup.py ("lppls") caches its kernels, the same files imported
+# from the repository root ("lppls.lppls") are compiled in every process.
+CACHE = __package__ == "lppls"
+
+# codes of the compiled local optimizers, see minimize_restricted
+NELDER_MEAD = 0
+LEVENBERG_MARQUARDT = 1
+
+
+@njit(cache=CACHE)
+def _normal_equations(t, p, tc, m, w, shift):
+    """
+    Accumulate the normal equations of the linear LPPLS parameters in a single pass.
+
+    The price is shifted by `shift` before accumulating to keep the sum of squares well conditioned.
+
+    Returns:
+        n, sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh, sy, syf, syg, syh, syy
+    """
+    sf = sg = sh = 0.0
+    sff = sfg = sfh = sgg = sgh = shh = 0.0
+    sy = syf = syg = syh = syy = 0.0
+    for i in range(t.shape[0]):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        fi = np.exp(m * log_dt)
+        gi = fi * np.cos(w * log_dt)
+        hi = fi * np.sin(w * log_dt)
+        yi = p[i] - shift
+
+        sf += fi
+        sg += gi
+        sh += hi
+        sff += fi * fi
+        sfg += fi * gi
+        sfh += fi * hi
+        sgg += gi * gi
+        sgh += gi * hi
+        shh += hi * hi
+        sy += yi
+        syf += yi * fi
+        syg += yi * gi
+        syh += yi * hi
+        syy += yi * yi
+    return float(t.shape[0]), sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh, sy, syf, syg, syh, syy
+
+
+@njit(cache=CACHE)
+def _cholesky4(n, sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh):
+    """
+    Unrolled Cholesky factorization of the regularized 4x4 normal matrix.
+
+    Returns:
+        l00, l10, l20, l30, l11, l21, l31, l22, l32, l33 (all NaN if the matrix is not positive definite)
+    """
+    eps = 1e-8
+    nan = np.nan
+    l00 = n + eps
+    if not l00 > 0.0:
+        return nan, nan, nan, nan, nan, nan, nan, nan, nan, nan
+    l00 = np.sqrt(l00)
+    l10 = sf / l00
+    l20 = sg / l00
+    l30 = sh / l00
+
+    l11 = sff + eps - l10 * l10
+    if not l11 > 0.0:
+        return nan, nan, nan, nan, nan, nan, nan, nan, nan, nan
+    l11 = np.sqrt(l11)
+    l21 = (sfg - l20 * l10) / l11
+    l31 = (sfh - l30 * l10) / l11
+
+    l22 = sgg + eps - l20 * l20 - l21 * l21
+    if not l22 > 0.0:
+        return nan, nan, nan, nan, nan, nan, nan, nan, nan, nan
+    l22 = np.sqrt(l22)
+    l32 = (sgh - l30 * l20 - l31 * l21) / l22
+
+    l33 = shh + eps - l30 * l30 - l31 * l31 - l32 * l32
+    if not l33 > 0.0:
+        return nan, nan, nan, nan, nan, nan, nan, nan, nan, nan
+    l33 = np.sqrt(l33)
+    return l00, l10, l20, l30, l11, l21, l31, l22, l32, l33
+
+
+@njit(cache=CACHE)
+def _cholesky4_solve(l00, l10, l20, l30, l11, l21, l31, l22, l32, l33, b0, b1, b2, b3):
+    """
+    Solve L L' x = b for a factor returned by _cholesky4.
+    """
+    # forward substitution
+    z0 = b0 / l00
+    z1 = (b1 - l10 * z0) / l11
+    z2 = (b2 - l20 * z0 - l21 * z1) / l22
+    z3 = (b3 - l30 * z0 - l31 * z1 - l32 * z2) / l33
+
+    # backward substitution
+    x3 = z3 / l33
+    x2 = (z2 - l32 * x3) / l22
+    x1 = (z1 - l21 * x2 - l31 * x3) / l11
+    x0 = (z0 - l10 * x1 - l20 * x2 - l30 * x3) / l00
+    return x0, x1, x2, x3
+
+
+@njit(cache=CACHE)
+def _solve_normal_equations(n, sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh, sy, syf, syg, syh, syy):
+    """
+    Solve the (regularized) 4x4 normal equations and derive the sum of squared residuals from the
+    same sums.
+
+    Returns:
+        sse, a, b, c1, c2 (all NaN if the system is not positive definite)
+    """
+    chol = _cholesky4(n, sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh)
+    x0, x1, x2, x3 = _cholesky4_solve(*chol, sy, syf, syg, syh)
+
+    # ||y - Fx||^2 = y'y - 2 x'F'y + x'F'Fx, using the unregularized F'F
+    xb = x0 * sy + x1 * syf + x2 * syg + x3 * syh
+    xAx = (
+        x0 * (n * x0 + sf * x1 + sg * x2 + sh * x3)
+        + x1 * (sf * x0 + sff * x1 + sfg * x2 + sfh * x3)
+        + x2 * (sg * x0 + sfg * x1 + sgg * x2 + sgh * x3)
+        + x3 * (sh * x0 + sfh * x1 + sgh * x2 + shh * x3)
+    )
+    sse = max(syy - 2.0 * xb + xAx, 0.0)
+    return sse, x0, x1, x2, x3
+
+
+@njit(cache=CACHE)
+def restricted_fit(observations, tc, m, w):
+    """
+    Fused LPPLS objective: slaves the linear parameters to (tc, m, w) and evaluates the sum of
+    squared residuals in one pass over the data without allocating temporaries.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        tc (float): critical time.
+        m (float): power law exponent.
+        w (float): log-periodic angular frequency.
+    Returns:
+        sse, a, b, c1, c2 (sse is np.inf if the linear system could not be solved)
+    """
+    t = observations[0]
+    p = observations[1]
+    shift = 0.0
+    for i in range(p.shape[0]):
+        shift += p[i]
+    shift /= max(p.shape[0], 1)
+
+    sums = _normal_equations(t, p, tc, m, w, shift)
+    sse, a, b, c1, c2 = _solve_normal_equations(*sums)
+    if not np.isfinite(sse):
+        return np.inf, np.nan, np.nan, np.nan, np.nan
+    return sse, a + shift, b, c1, c2
+
+
+@njit(cache=CACHE)
+def restricted_sse(observations, tc, m, w):
+    """
+    Sum of squared residuals of the LPPLS model with the linear parameters slaved to (tc, m, w).
+    See restricted_fit.
+    """
+    return restricted_fit(observations, tc, m, w)[0]
+
+
+@njit(cache=CACHE)
+def evaluate_candidates(observations, params):
+    """
+    Score many nonlinear parameter candidates against the same observations.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        params (np.ndarray): Kx3 array of (tc, m, w) candidates.
+    Returns:
+        sse (np.ndarray): K sums of squared residuals (np.inf where the linear system failed).
+        lin (np.ndarray): Kx4 array of the slaved linear parameters (a, b, c1, c2).
+    """
+    n_candidates = params.shape[0]
+    sse = np.empty(n_candidates)
+    lin = np.empty((n_candidates, 4))
+    for k in range(n_candidates):
+        sse[k], lin[k, 0], lin[k, 1], lin[k, 2], lin[k, 3] = restricted_fit(
+            observations, params[k, 0], params[k, 1], params[k, 2]
+        )
+    return sse, lin
+
+
+@njit(cache=CACHE, nogil=True)
+def evaluate_chisquare_candidates(observations, params):
+    """
+    Chi-square statistic sum((fit - p)^2 / p) of many (tc, m, w) candidates, the fitness of LPPLSCMAES.
+
+    As in LPPLSCMAES.fun_restricted, the linear parameters are slaved by least squares (all 0 if the linear
+    system could not be solved) and non-finite model values count as 0. Releases the GIL, so chunks of a
+    population can be scored on several threads.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        params (np.ndarray): Kx3 array of (tc, m, w) candidates.
+    Returns:
+        chi2 (np.ndarray): K statistics.
+    """
+    t = observations[0]
+    p = observations[1]
+    chi2 = np.empty(params.shape[0])
+    for k in range(params.shape[0]):
+        tc = params[k, 0]
+        m = params[k, 1]
+        w = params[k, 2]
+        sse, a, b, c1, c2 = restricted_fit(observations, tc, m, w)
+        if not np.isfinite(sse):
+            a = b = c1 = c2 = 0.0
+        total = 0.0
+        for i in range(t.shape[0]):
+            dt = np.abs(tc - t[i]) + 1e-8
+            log_dt = np.log(dt)
+            fit = a + np.exp(m * log_dt) * (b + c1 * np.cos(w * log_dt) + c2 * np.sin(w * log_dt))
+            if not np.isfinite(fit):
+                fit = 0.0
+            total += (fit - p[i]) ** 2 / p[i]
+        chi2[k] = total
+    return chi2
+
+
+@njit(cache=CACHE)
+def nested_restricted_fit(observations, tc, m, w, starts):
+    """
+    Fused LPPLS objective for every nested window ending at the last observation.
+
+    The normal equations of the window observations[:, j:] are suffix sums of the same per-point terms,
+    so a single backward pass over the data serves all windows: O(M + len(starts)) instead of
+    O(M * len(starts)).
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        tc, m, w (float): nonlinear parameters shared by all windows.
+        starts (np.ndarray): start index j of each window observations[:, j:].
+    Returns:
+        sse (np.ndarray): sum of squared residuals per window (np.inf where the system could not be solved
+            or the start index is out of range).
+        lin (np.ndarray): len(starts)x4 array of the slaved linear parameters (a, b, c1, c2) per window.
+    """
+    t = observations[0]
+    p = observations[1]
+    n_obs = t.shape[0]
+    n_windows = starts.shape[0]
+    sse = np.full(n_windows, np.inf)
+    lin = np.full((n_windows, 4), np.nan)
+
+    shift = 0.0
+    for i in range(n_obs):
+        shift += p[i]
+    shift /= max(n_obs, 1)
+
+    # visit the windows from the shortest to the longest while accumulating backwards
+    order = np.argsort(-starts, kind="mergesort")
+    k = 0
+    while k < n_windows and starts[order[k]] >= n_obs:
+        k += 1
+
+    n = sf = sg = sh = 0.0
+    sff = sfg = sfh = sgg = sgh = shh = 0.0
+    sy = syf = syg = syh = syy = 0.0
+    for i in range(n_obs - 1, -1, -1):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        fi = np.exp(m * log_dt)
+        gi = fi * np.cos(w * log_dt)
+        hi = fi * np.sin(w * log_dt)
+        yi = p[i] - shift
+
+        n += 1.0
+        sf += fi
+        sg += gi
+        sh += hi
+        sff += fi * fi
+        sfg += fi * gi
+        sfh += fi * hi
+        sgg += gi * gi
+        sgh += gi * hi
+        shh += hi * hi
+        sy += yi
+        syf += yi * fi
+        syg += yi * gi
+        syh += yi * hi
+        syy += yi * yi
+
+        while k < n_windows and starts[order[k]] == i:
+            window_sse, a, b, c1, c2 = _solve_normal_equations(
+                n, sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh, sy, syf, syg, syh, syy
+            )
+            if np.isfinite(window_sse):
+                idx = order[k]
+                sse[idx] = window_sse
+                lin[idx, 0] = a + shift
+                lin[idx, 1] = b
+                lin[idx, 2] = c1
+                lin[idx, 3] = c2
+            k += 1
+    return sse, lin
+
+
+@njit(cache=CACHE)
+def evaluate_nested_candidates(observations, params, starts):
+    """
+    Score many (tc, m, w) candidates against every nested window ending at the last observation,
+    see nested_restricted_fit.
+
+    Returns:
+        sse (np.ndarray): Kxlen(starts) sums of squared residuals.
+        lin (np.ndarray): Kxlen(starts)x4 array of the slaved linear parameters (a, b, c1, c2).
+    """
+    n_candidates = params.shape[0]
+    sse = np.empty((n_candidates, starts.shape[0]))
+    lin = np.empty((n_candidates, starts.shape[0], 4))
+    for k in range(n_candidates):
+        sse[k], lin[k] = nested_restricted_fit(observations, params[k, 0], params[k, 1], params[k, 2], starts)
+    return sse, lin
+
+
+@njit(cache=CACHE)
+def _basis(observations, tc, m, w):
+    """
+    Returns:
+        f, g, h (np.ndarray): the LPPLS basis functions at every timestamp
+    """
+    t = observations[0]
+    f = np.empty(t.shape[0])
+    g = np.empty(t.shape[0])
+    h = np.empty(t.shape[0])
+    for i in range(t.shape[0]):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        f[i] = np.exp(m * log_dt)
+        g[i] = f[i] * np.cos(w * log_dt)
+        h[i] = f[i] * np.sin(w * log_dt)
+    return f, g, h
+
+
+@njit(cache=CACHE)
+def _quantile_linear_fit(p, f, g, h, q, max_iter, tol):
+    """
+    Linear parameters (a, b, c1, c2) minimizing the pinball loss of quantile q for fixed basis functions, by
+    iteratively reweighted least squares started from the least squares fit, its intercept shifted to the q-quantile
+    of its residuals. The shift puts the start close to the quantile fit, so a few iterations get most of the way.
+
+    The pinball loss of a residual r = p - fit is q * r for r >= 0 and (q - 1) * r for r < 0, every iteration
+    solves the weighted normal equations with weights q / |r| and (1 - q) / |r|.
+
+    Returns:
+        loss, a, b, c1, c2 of the best iterate (loss is np.inf if the linear system could not be solved)
+    """
+    n_obs = p.shape[0]
+    shift = 0.0
+    scale = 0.0
+    for i in range(n_obs):
+        shift += p[i]
+    shift /= max(n_obs, 1)
+    for i in range(n_obs):
+        scale += np.abs(p[i] - shift)
+    # residuals below this are weighted as if they were this small, keeps the weights bounded
+    eps = max(scale / max(n_obs, 1), 1e-12) * 1e-6
+
+    weights = np.ones(n_obs)
+    best = np.inf
+    best_a = best_b = best_c1 = best_c2 = np.nan
+    for it in range(max_iter):
+        sw = swf = swg = swh = swff = swfg = swfh = swgg = swgh = swhh = 0.0
+        swy = swyf = swyg = swyh = 0.0
+        for i in range(n_obs):
+            wi = weights[i]
+            yi = p[i] - shift
+            sw += wi
+            swf += wi * f[i]
+            swg += wi * g[i]
+            swh += wi * h[i]
+            swff += wi * f[i] * f[i]
+            swfg += wi * f[i] * g[i]
+            swfh += wi * f[i] * h[i]
+            swgg += wi * g[i] * g[i]
+            swgh += wi * g[i] * h[i]
+            swhh += wi * h[i] * h[i]
+            swy += wi * yi
+            swyf += wi * yi * f[i]
+            swyg += wi * yi * g[i]
+            swyh += wi * yi * h[i]
+        chol = _cholesky4(sw, swf, swg, swh, swff, swfg, swfh, swgg, swgh, swhh)
+        a, b, c1, c2 = _cholesky4_solve(*chol, swy, swyf, swyg, swyh)
+        if not (np.isfinite(a) and np.isfinite(b) and np.isfinite(c1) and np.isfinite(c2)):
+            break
+        if it == 0:
+            # start from the least squares fit shifted to the quantile
+            residuals = np.empty(n_obs)
+            for i in range(n_obs):
+                residuals[i] = p[i] - shift - (a + b * f[i] + c1 * g[i] + c2 * h[i])
+            a += np.quantile(residuals, q)
+
+        loss = 0.0
+        for i in range(n_obs):
+            r = p[i] - shift - (a + b * f[i] + c1 * g[i] + c2 * h[i])
+            loss += q * r if r >= 0.0 else (q - 1.0) * r
+            weights[i] = (q if r >= 0.0 else 1.0 - q) / max(np.abs(r), eps)
+
+        converged = loss >= best - tol * best
+        if loss < best:
+            best = loss
+            best_a, best_b, best_c1, best_c2 = a + shift, b, c1, c2
+        if converged:
+            break
+    return best, best_a, best_b, best_c1, best_c2
+
+
+# IRLS iterations and relative tolerance of the quantile objective (quantile_loss, evaluate_quantile_candidates),
+# evaluated for every step of a search. Converged to within a few percent of the full IRLS of quantile_fit, which
+# only derives the linear parameters of the final fit, at a fraction of its cost.
+QUANTILE_OBJECTIVE_MAX_ITER = 10
+QUANTILE_OBJECTIVE_TOL = 1e-4
+
+
+@njit(cache=CACHE)
+def quantile_fit(observations, tc, m, w, q, max_iter=100, tol=1e-8):
+    """
+    Quantile LPPLS objective: slaves the linear parameters to (tc, m, w) under the pinball loss of
+    quantile q, see _quantile_linear_fit.
+
+    Returns:
+        loss, a, b, c1, c2 (loss is np.inf if the linear system could not be solved)
+    """
+    f, g, h = _basis(observations, tc, m, w)
+    return _quantile_linear_fit(observations[1], f, g, h, q, max_iter, tol)
+
+
+@njit(cache=CACHE)
+def quantile_loss(observations, tc, m, w, q):
+    """
+    Pinball loss of quantile q of the LPPLS model, the objective of the searches. Runs at most
+    QUANTILE_OBJECTIVE_MAX_ITER iterations of quantile_fit, so it bounds the loss of the full fit from above.
+    """
+    return quantile_fit(observations, tc, m, w, q, QUANTILE_OBJECTIVE_MAX_ITER, QUANTILE_OBJECTIVE_TOL)[0]
+
+
+@njit(cache=CACHE)
+def evaluate_quantile_candidates(observations, params, quantiles):
+    """
+    Score many (tc, m, w) candidates for many quantiles, the basis functions of a candidate are
+    computed once for all quantiles.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        params (np.ndarray): Kx3 array of (tc, m, w) candidates.
+        quantiles (np.ndarray): Q quantiles in (0, 1).
+    Returns:
+        loss (np.ndarray): KxQ pinball losses as computed by quantile_loss (np.inf where the linear system failed).
+    """
+    loss = np.empty((params.shape[0], quantiles.shape[0]))
+    for k in range(params.shape[0]):
+        f, g, h = _basis(observations, params[k, 0], params[k, 1], params[k, 2])
+        for j in range(quantiles.shape[0]):
+            loss[k, j] = _quantile_linear_fit(
+                observations[1], f, g, h, quantiles[j], QUANTILE_OBJECTIVE_MAX_ITER, QUANTILE_OBJECTIVE_TOL
+            )[0]
+    return loss
+
+
+@njit(cache=CACHE)
+def _basis_derivatives(t, tc, m, w):
+    """
+    Basis functions f, g, h at one timestamp and their derivatives with respect to tc, m and w.
+
+    Returns:
+        f, g, h, df_dtc, dg_dtc, dh_dtc, df_dm, dg_dm, dh_dm, dg_dw, dh_dw (df_dw is always 0)
+    """
+    dt = np.abs(tc - t) + 1e-8
+    log_dt = np.log(dt)
+    f = np.exp(m * log_dt)
+    g = f * np.cos(w * log_dt)
+    h = f * np.sin(w * log_dt)
+    # d(dt)/d(tc) = sign(tc - t)
+    s = np.sign(tc - t) / dt
+    return (
+        f, g, h,
+        s * m * f, s * (m * g - w * h), s * (m * h + w * g),
+        log_dt * f, log_dt * g, log_dt * h,
+        -log_dt * h, log_dt * g,
+    )
+
+
+@njit(cache=CACHE)
+def restricted_gradient(observations, tc, m, w):
+    """
+    Analytic gradient of restricted_sse with respect to (tc, m, w).
+
+    With the linear parameters slaved to their least squares values the gradient only needs the
+    partial derivatives of the model at fixed (a, b, c1, c2) (variable projection).
+
+    Returns:
+        sse, d_tc, d_m, d_w (the derivatives are NaN if the linear system could not be solved)
+    """
+    t = observations[0]
+    p = observations[1]
+    sse, a, b, c1, c2 = restricted_fit(observations, tc, m, w)
+    if not np.isfinite(sse):
+        return sse, np.nan, np.nan, np.nan
+
+    d_tc = d_m = d_w = 0.0
+    for i in range(t.shape[0]):
+        f, g, h, f_tc, g_tc, h_tc, f_m, g_m, h_m, g_w, h_w = _basis_derivatives(t[i], tc, m, w)
+        r = a + b * f + c1 * g + c2 * h - p[i]
+        d_tc += r * (b * f_tc + c1 * g_tc + c2 * h_tc)
+        d_m += r * (b * f_m + c1 * g_m + c2 * h_m)
+        d_w += r * (c1 * g_w + c2 * h_w)
+    return sse, 2.0 * d_tc, 2.0 * d_m, 2.0 * d_w
+
+
+@njit(cache=CACHE)
+def restricted_residuals(observations, tc, m, w):
+    """
+    Residuals of the LPPLS model with the linear parameters slaved to (tc, m, w), see restricted_fit.
+
+    Returns:
+        residuals (np.ndarray): M model minus observed values (all NaN if the linear system could not be solved).
+    """
+    t = observations[0]
+    p = observations[1]
+    residuals = np.empty(t.shape[0])
+    sse, a, b, c1, c2 = restricted_fit(observations, tc, m, w)
+    if not np.isfinite(sse):
+        residuals[:] = np.nan
+        return residuals
+    for i in range(t.shape[0]):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        residuals[i] = a + np.exp(m * log_dt) * (b + c1 * np.cos(w * log_dt) + c2 * np.sin(w * log_dt)) - p[i]
+    return residuals
+
+
+@njit(cache=CACHE)
+def restricted_jacobian(observations, tc, m, w):
+    """
+    Residuals of the LPPLS model with the linear parameters slaved to (tc, m, w) and their exact
+    variable projection Jacobian (Golub & Pereyra) with respect to (tc, m, w).
+
+    Returns:
+        residuals (np.ndarray): M model minus observed values.
+        jac (np.ndarray): Mx3 derivatives of the residuals with respect to tc, m and w.
+    """
+    t = observations[0]
+    p = observations[1]
+    n_obs = t.shape[0]
+    residuals = np.empty(n_obs)
+    jac = np.empty((n_obs, 3))
+
+    sse, a, b, c1, c2 = restricted_fit(observations, tc, m, w)
+    if not np.isfinite(sse):
+        residuals[:] = np.nan
+        jac[:] = np.nan
+        return residuals, jac
+
+    # first pass: residuals e, model derivatives v_k at fixed linear params, and the right hand sides
+    # F'v_k - dF_k'e of the correction terms
+    sf = sg = sh = sff = sfg = sfh = sgg = sgh = shh = 0.0
+    rhs = np.zeros((3, 4))
+    for i in range(n_obs):
+        f, g, h, f_tc, g_tc, h_tc, f_m, g_m, h_m, g_w, h_w = _basis_derivatives(t[i], tc, m, w)
+        e = a + b * f + c1 * g + c2 * h - p[i]
+        v_tc = b * f_tc + c1 * g_tc + c2 * h_tc
+        v_m = b * f_m + c1 * g_m + c2 * h_m
+        v_w = c1 * g_w + c2 * h_w
+        residuals[i] = e
+        jac[i, 0] = v_tc
+        jac[i, 1] = v_m
+        jac[i, 2] = v_w
+
+        sf += f
+        sg += g
+        sh += h
+        sff += f * f
+        sfg += f * g
+        sfh += f * h
+        sgg += g * g
+        sgh += g * h
+        shh += h * h
+
+        # e is model minus observed here, hence the sign flip on the dF'e terms
+        rhs[0, 0] += v_tc
+        rhs[0, 1] += v_tc * f + e * f_tc
+        rhs[0, 2] += v_tc * g + e * g_tc
+        rhs[0, 3] += v_tc * h + e * h_tc
+        rhs[1, 0] += v_m
+        rhs[1, 1] += v_m * f + e * f_m
+        rhs[1, 2] += v_m * g + e * g_m
+        rhs[1, 3] += v_m * h + e * h_m
+        rhs[2, 0] += v_w
+        rhs[2, 1] += v_w * f
+        rhs[2, 2] += v_w * g + e * g_w
+        rhs[2, 3] += v_w * h + e * h_w
+
+    chol = _cholesky4(float(n_obs), sf, sg, sh, sff, sfg, sfh, sgg, sgh, shh)
+    s = np.empty((3, 4))
+    for k in range(3):
+        s[k, 0], s[k, 1], s[k, 2], s[k, 3] = _cholesky4_solve(
+            *chol, rhs[k, 0], rhs[k, 1], rhs[k, 2], rhs[k, 3]
+        )
+
+    # second pass: J_k = v_k - F s_k
+    for i in range(n_obs):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        f = np.exp(m * log_dt)
+        g = f * np.cos(w * log_dt)
+        h = f * np.sin(w * log_dt)
+        for k in range(3):
+            jac[i, k] -= s[k, 0] + s[k, 1] * f + s[k, 2] * g + s[k, 3] * h
+    return residuals, jac
+
+
+@njit(cache=CACHE)
+def _sort_simplex(sim, fsim):
+    """
+    Stable insertion sort of the simplex vertices by their objective value.
+    """
+    for i in range(1, fsim.shape[0]):
+        f = fsim[i]
+        x0, x1, x2 = sim[i, 0], sim[i, 1], sim[i, 2]
+        j = i - 1
+        while j >= 0 and fsim[j] > f:
+            fsim[j + 1] = fsim[j]
+            sim[j + 1, 0], sim[j + 1, 1], sim[j + 1, 2] = sim[j, 0], sim[j, 1], sim[j, 2]
+            j -= 1
+        fsim[j + 1] = f
+        sim[j + 1, 0], sim[j + 1, 1], sim[j + 1, 2] = x0, x1, x2
+
+
+@njit(cache=CACHE)
+def _clip3(x, lower, upper):
+    for d in range(3):
+        x[d] = min(max(x[d], lower[d]), upper[d])
+
+
+@njit(cache=CACHE)
+def nelder_mead(observations, x0, xatol=1e-4, fatol=1e-4, maxiter=600):
+    """
+    Nelder-Mead simplex minimization of restricted_sse, following scipy.optimize.minimize(method="Nelder-Mead")
+    with its default settings, so it can run inside compiled (and multi-threaded) code.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        x0 (np.ndarray): (tc, m, w) starting point.
+        xatol, fatol (float): absolute tolerances on the simplex size and objective spread.
+        maxiter (int): maximum number of iterations and of objective evaluations.
+    Returns:
+        x (np.ndarray): (tc, m, w) of the best vertex, fun (float): its SSE, success (bool): converged within maxiter
+    """
+    lower = np.full(3, -np.inf)
+    upper = np.full(3, np.inf)
+    return nelder_mead_bounded(observations, x0, lower, upper, xatol, fatol, maxiter)
+
+
+@njit(cache=CACHE)
+def nelder_mead_bounded(observations, x0, lower, upper, xatol=1e-4, fatol=1e-4, maxiter=600):
+    """
+    nelder_mead inside the box lower <= (tc, m, w) <= upper. Like scipy's bounded Nelder-Mead, the initial
+    simplex is reflected into the box and every trial point is clipped to it, so with infinite bounds both
+    give the same iterates.
+
+    Args:
+        lower, upper (np.ndarray): (tc, m, w) bounds, use -np.inf / np.inf for an unbounded parameter.
+        see nelder_mead for the other arguments.
+    Returns:
+        x (np.ndarray): (tc, m, w) of the best vertex, fun (float): its SSE, success (bool): converged within maxiter
+    """
+    rho, chi, psi, sigma = 1.0, 2.0, 0.5, 0.5
+    n = 3
+    sim = np.empty((n + 1, n))
+    fsim = np.empty(n + 1)
+    xbar = np.empty(n)
+    xr = np.empty(n)
+    xe = np.empty(n)
+    xc = np.empty(n)
+
+    sim[0] = x0
+    _clip3(sim[0], lower, upper)
+    for k in range(n):
+        sim[k + 1] = sim[0]
+        sim[k + 1, k] = 1.05 * sim[0, k] if sim[0, k] != 0 else 0.00025
+    for k in range(n + 1):
+        # reflect into the interior
+        for d in range(n):
+            if sim[k, d] > upper[d]:
+                sim[k, d] = 2 * upper[d] - sim[k, d]
+        _clip3(sim[k], lower, upper)
+        fsim[k] = restricted_sse(observations, sim[k, 0], sim[k, 1], sim[k, 2])
+    fcalls = n + 1
+    _sort_simplex(sim, fsim)
+
+    iterations = 1
+    while fcalls < maxiter and iterations < maxiter:
+        size = 0.0
+        spread = 0.0
+        for k in range(1, n + 1):
+            spread = max(spread, np.abs(fsim[0] - fsim[k]))
+            for d in range(n):
+                size = max(size, np.abs(sim[k, d] - sim[0, d]))
+        if size <= xatol and spread <= fatol:
+            break
+
+        for d in range(n):
+            xbar[d] = (sim[0, d] + sim[1, d] + sim[2, d]) / n
+            xr[d] = (1 + rho) * xbar[d] - rho * sim[n, d]
+        _clip3(xr, lower, upper)
+        fxr = restricted_sse(observations, xr[0], xr[1], xr[2])
+        fcalls += 1
+        doshrink = False
+
+        if fxr < fsim[0]:
+            for d in range(n):
+                xe[d] = (1 + rho * chi) * xbar[d] - rho * chi * sim[n, d]
+            _clip3(xe, lower, upper)
+            fxe = restricted_sse(observations, xe[0], xe[1], xe[2])
+            fcalls += 1
+            if fxe < fxr:
+                sim[n] = xe
+                fsim[n] = fxe
+            else:
+                sim[n] = xr
+                fsim[n] = fxr
+        elif fxr < fsim[n - 1]:
+            sim[n] = xr
+            fsim[n] = fxr
+        else:
+            if fxr < fsim[n]:
+                # contraction outside the simplex
+                for d in range(n):
+                    xc[d] = (1 + psi * rho) * xbar[d] - psi * rho * sim[n, d]
+                _clip3(xc, lower, upper)
+                fxc = restricted_sse(observations, xc[0], xc[1], xc[2])
+                fcalls += 1
+                if fxc <= fxr:
+                    sim[n] = xc
+                    fsim[n] = fxc
+                else:
+                    doshrink = True
+            else:
+                # contraction inside the simplex
+                for d in range(n):
+                    xc[d] = (1 - psi) * xbar[d] + psi * sim[n, d]
+                _clip3(xc, lower, upper)
+                fxc = restricted_sse(observations, xc[0], xc[1], xc[2])
+                fcalls += 1
+                if fxc < fsim[n]:
+                    sim[n] = xc
+                    fsim[n] = fxc
+                else:
+                    doshrink = True
+
+            if doshrink:
+                for k in range(1, n + 1):
+                    for d in range(n):
+                        sim[k, d] = sim[0, d] + sigma * (sim[k, d] - sim[0, d])
+                    _clip3(sim[k], lower, upper)
+                    fsim[k] = restricted_sse(observations, sim[k, 0], sim[k, 1], sim[k, 2])
+                fcalls += n
+
+        iterations += 1
+        _sort_simplex(sim, fsim)
+
+    success = fcalls < maxiter and iterations < maxiter
+    return sim[0].copy(), fsim[0], success
+
+
+@njit(cache=CACHE)
+def levenberg_marquardt(observations, x0, lower, upper, ftol=1e-8, xtol=1e-8, gtol=1e-8, max_nfev=300):
+    """
+    Levenberg-Marquardt minimization of restricted_sse using the variable projection Jacobian of
+    restricted_jacobian. Steps are clipped to the box lower <= (tc, m, w) <= upper.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        x0 (np.ndarray): (tc, m, w) starting point.
+        lower, upper (np.ndarray): (tc, m, w) bounds, use -np.inf / np.inf for an unbounded parameter.
+        ftol (float): stop when a step reduces the SSE by less than ftol relative to the SSE.
+        xtol (float): stop when a step is smaller than xtol relative to the norm of (tc, m, w).
+        gtol (float): stop when the largest component of the gradient J'r is below gtol.
+        max_nfev (int): maximum number of residual and Jacobian evaluations.
+    Returns:
+        x (np.ndarray): (tc, m, w) solution, fun (float): its SSE, success (bool): converged within max_nfev
+    """
+    x = x0.copy()
+    _clip3(x, lower, upper)
+    residuals, jac = restricted_jacobian(observations, x[0], x[1], x[2])
+    cost = np.sum(residuals ** 2)
+    if not np.isfinite(cost):
+        return x, np.inf, False
+    nfev = 1
+
+    A = np.empty((3, 3))
+    g = np.empty(3)
+    x_new = np.empty(3)
+    lam = -1.0
+    while nfev < max_nfev:
+        for r in range(3):
+            g[r] = np.sum(jac[:, r] * residuals)
+            for s in range(r, 3):
+                A[r, s] = np.sum(jac[:, r] * jac[:, s])
+                A[s, r] = A[r, s]
+        if np.max(np.abs(g)) <= gtol:
+            return x, cost, True
+        if lam < 0:
+            lam = 1e-3 * max(A[0, 0], A[1, 1], A[2, 2])
+
+        # damped normal equations (A + lam diag(A)) step = -g
+        chol = _cholesky4(
+            1.0, 0.0, 0.0, 0.0,
+            A[0, 0] * (1 + lam), A[0, 1], A[0, 2],
+            A[1, 1] * (1 + lam), A[1, 2],
+            A[2, 2] * (1 + lam),
+        )
+        _, d0, d1, d2 = _cholesky4_solve(*chol, 0.0, -g[0], -g[1], -g[2])
+        x_new[0] = x[0] + d0
+        x_new[1] = x[1] + d1
+        x_new[2] = x[2] + d2
+        _clip3(x_new, lower, upper)
+
+        res_new, jac_new = restricted_jacobian(observations, x_new[0], x_new[1], x_new[2])
+        nfev += 1
+        cost_new = np.sum(res_new ** 2)
+        if np.isfinite(cost_new) and cost_new < cost:
+            step = np.sqrt(np.sum((x_new - x) ** 2))
+            reduction = cost - cost_new
+            x[:] = x_new
+            residuals, jac, cost = res_new, jac_new, cost_new
+            lam = max(lam / 3.0, 1e-12)
+            if reduction <= ftol * cost or step <= xtol * (xtol + np.sqrt(np.sum(x ** 2))):
+                return x, cost, True
+        else:
+            lam *= 2.0
+            if lam > 1e16:
+                # no step along the gradient reduces the SSE any more
+                return x, cost, True
+    return x, cost, False
+
+
+@njit(cache=CACHE)
+def minimize_restricted(observations, x0, lower, upper, method):
+    """
+    Runs the compiled local optimizer selected by method (NELDER_MEAD or LEVENBERG_MARQUARDT) with its
+    default tolerances.
+
+    Returns:
+        x (np.ndarray): (tc, m, w) solution, fun (float): its SSE, success (bool)
+    """
+    if method == LEVENBERG_MARQUARDT:
+        return levenberg_marquardt(observations, x0, lower, upper)
+    return nelder_mead_bounded(observations, x0, lower, upper)
+
+
+@njit(cache=CACHE, error_model="numpy")
+def _fit_window(observations, max_searches, tc_pct, m_min, m_max, w_min, w_max, method, out):
+    """
+    Compiled counterpart of LPPLS.fit with random seeding and a compiled minimizer, see minimize_restricted.
+    Writes tc, m, w, a, b, c, c1, c2, t1, t2, O, D to out (zeros for the parameters if every search fails).
+    """
+    t1 = observations[0, 0]
+    t2 = observations[0, -1]
+    x0 = np.empty(3)
+    lower = np.full(3, -np.inf)
+    upper = np.full(3, np.inf)
+    out[:] = 0.0
+    out[8] = t1
+    out[9] = t2
+    for _ in range(max_searches):
+        x0[0] = np.random.uniform(t2 - tc_pct * (t2 - t1), t2 + tc_pct * (t2 - t1))
+        x0[1] = np.random.uniform(m_min, m_max)
+        x0[2] = np.random.uniform(w_min, w_max)
+        x, _, success = minimize_restricted(observations, x0, lower, upper, method)
+        if not success:
+            continue
+        tc, m, w = x[0], x[1], x[2]
+        sse, a, b, c1, c2 = restricted_fit(observations, tc, m, w)
+        if not np.isfinite(sse):
+            continue
+        # same as LPPLS.get_c
+        c = c1 / np.cos(np.arctan(c2 / c1)) if c1 != 0 and c2 != 0 else 0.0
+        out[0] = tc
+        out[1] = m
+        out[2] = w
+        out[3] = a
+        out[4] = b
+        out[5] = c
+        out[6] = c1
+        out[7] = c2
+        out[10] = (w / (2.0 * np.pi)) * np.log((tc - t1) / (tc - t2))
+        out[11] = (m * np.abs(b)) / (w * np.abs(c))
+        return
+
+
+@njit(cache=CACHE, parallel=True, nogil=True)
+def nested_fits_parallel(
+    observations, outer_starts, window_size, inner_offsets, max_searches, random_state, method=NELDER_MEAD
+):
+    """
+    The whole nested fit loop of LPPLS.mp_compute_nested_fits in compiled code, with the outer windows spread
+    over threads.
+
+    Args:
+        observations (np.ndarray): 2xM matrix with timestamp and observed value.
+        outer_starts (np.ndarray): start index i of every outer window observations[:, i:i + window_size].
+        window_size (int): size of the outer windows.
+        inner_offsets (np.ndarray): offset j of every shrinking window observations[:, i + j:i + window_size].
+        max_searches (int): see LPPLS.fit.
+        random_state (int): seeds the searches of outer window k with random_state + k, so the result doesn't
+            depend on the number of threads.
+        method (int): NELDER_MEAD or LEVENBERG_MARQUARDT, see minimize_restricted.
+    Returns:
+        (np.ndarray) len(outer_starts)xlen(inner_offsets)x12 array of tc, m, w, a, b, c, c1, c2, t1, t2, O, D
+    """
+    n_outer = outer_starts.shape[0]
+    n_inner = inner_offsets.shape[0]
+    out = np.empty((n_outer, n_inner, 12))
+    for k in prange(n_outer):
+        np.random.seed(random_state + k)
+        start = outer_starts[k]
+        for idx in range(n_inner):
+            window = observations[:, start + inner_offsets[idx]:start + window_size]
+            # same initialization limits as LPPLS._get_init_limits
+            _fit_window(window, max_searches, 0.2, 0.1, 1.0, 6.0, 13.0, method, out[k, idx])
+    return out
+
+
+def warmup(parallel=False):
+    """
+    Compiles the kernels (or loads them from the on-disk cache) by running them on a tiny synthetic series,
+    contiguous and sliced, so the first real fit doesn't pay the JIT compilation.
+
+    Args:
+        parallel (bool): also compile nested_fits_parallel, the kernel of the numba backend
+    """
+    t = np.arange(9, dtype=np.float64)
+    series = np.vstack((t, np.log(10.0 + t)))
+    params = np.array([[10.0, 0.5, 8.0]])
+    starts = np.array([0, 2])
+    lower = np.full(3, -np.inf)
+    upper = np.full(3, np.inf)
+    # numba compiles one signature per array layout, the fits mostly get windows sliced out of a 2xM matrix
+    # (layout "A") and the whole matrix (layout "C")
+    for observations in (np.ascontiguousarray(series[:, 1:]), series[:, 1:]):
+        restricted_sse(observations, 10.0, 0.5, 8.0)
+        evaluate_candidates(observations, params)
+        restricted_gradient(observations, 10.0, 0.5, 8.0)
+        restricted_residuals(observations, 10.0, 0.5, 8.0)
+        restricted_jacobian(observations, 10.0, 0.5, 8.0)
+        evaluate_nested_candidates(observations, params, starts)
+        quantile_fit(observations, 10.0, 0.5, 8.0, 0.5)
+        quantile_loss(observations, 10.0, 0.5, 8.0, 0.5)
+        evaluate_quantile_candidates(observations, params, np.array([0.5]))
+        evaluate_chisquare_candidates(observations, params)
+        for method in (NELDER_MEAD, LEVENBERG_MARQUARDT):
+            minimize_restricted(observations, params[0], lower, upper, method)
+    if parallel:
+        # the types of LPPLS._compute_nested_fits_numba: a contiguous matrix, int64 index arrays and the method
+        # passed explicitly, an omitted argument would compile a signature the real call never uses
+        nested_fits_parallel(
+            np.ascontiguousarray(series[:, 1:]), starts.astype(np.int64), 6, np.zeros(1, dtype=np.int64), 1, 0,
+            NELDER_MEAD,
+        )
@@ -1,22 +1,61 @@
-from multiprocessing import Pool
-from matplotlib import pyplot as plt
-import matplotlib.dates as mdates
+from multiprocessing.shared_memory import SharedMemory
+import numba
 from numba import njit
 import numpy as np
 import pandas as pd
 import random
 from datetime import datetime as date
-from pandas._libs.tslibs.np_datetime import OutOfBoundsDatetime
+from contextlib import nullcontext
+from itertools import chain, islice
+import os
+import uuid
 from scipy.optimize import minimize
-from sklearn.linear_model import LinearRegression
-from tqdm import tqdm
-import xarray as xr
 from typing import Any, Dict, Optional
 import warnings
 
+from .kernels import (
+    CACHE, LEVENBERG_MARQUARDT, NELDER_MEAD, evaluate_candidates, evaluate_nested_candidates, minimize_restricted,
+    nested_fits_parallel, restricted_gradient, restricted_jacobian, restricted_sse, warmup as warmup_kernels,
+)
+from .nested_fits import FIT_DTYPE, NestedFits
+from .engine import LPPLSEngine, _run_task, _run_tagged_task
+
+# scipy.optimize.minimize methods that use the analytic gradient / (Gauss-Newton) hessian of the objective
+JAC_MINIMIZERS = {"cg", "bfgs", "l-bfgs-b", "tnc", "slsqp", "trust-constr"}
+HESS_MINIMIZERS = {"trust-constr"}
+# scipy.optimize.minimize methods searching inside the bounds of LPPLS._get_search_bounds
+BOUNDED_MINIMIZERS = {"l-bfgs-b", "tnc", "slsqp", "trust-constr"}
+# hessian based methods without bounds, their steps leave the region where the LPPLS objective is defined
+UNBOUNDED_HESS_MINIMIZERS = {"newton-cg", "dogleg", "trust-ncg", "trust-krylov", "trust-exact"}
+# local optimizers compiled with numba in the kernels module, usable with the LPPLS objective only
+COMPILED_MINIMIZERS = {"numba-nelder-mead": NELDER_MEAD, "numba-lm": LEVENBERG_MARQUARDT}
+
+# conditions a nested fit must meet to count towards the confidence indicators, see LPPLS.compute_indicators
+DEFAULT_FILTER_CONDITIONS = {
+    "m": (0.0, 1.0),
+    "w": (2.0, 15.0),
+    "O_min": 2.5,
+    "D_min": 0.5,
+    "tc_before": 60,
+    "tc_after": 252,
+    "tc_window_pct": 0.5,
+}
+
+# The number of degrees of freedom used for this exercise as well as for the real-world time series is p = 8, which
+# includes the 7 parameters of the LPPLS model augmented by the extra parameter t1, see detect_bubble_start_time_via_lagrange
+LAGRANGE_N_PARAMS = 7
+
+# last axis of the array returned by LPPLS.compute_nested_fits, t1 and t2 are the bounds of the outer window
+NESTED_FITS_PARAMS = ("t2", "t1", "a", "b", "c", "m", "0", "tc")
+
 
 class LPPLS(object):
 
+    # resolution of the (tc, m, w) lattice scored by fit(seeding="grid")
+    SEED_GRID_SHAPE = (8, 5, 8)
+    # fit(seeding="sobol") scores 2**SEED_SOBOL_LOG2_POINTS quasi-random candidates
+    SEED_SOBOL_LOG2_POINTS = 8
+
     def __init__(self, observations):
         """
         Args:
@@ -29,9 +68,30 @@ class LPPLS(object):
         self.observations = observations
         self.coef_ = {}
         self.indicator_result = []
+        # settings of the last nested fits and the last indicators computed from them, see append
+        self.nested_fits_settings = None
+        self.indicators = None
+        self.indicators_filter_conditions = None
 
     @staticmethod
-    @njit
+    def warmup(parallel=False):
+        """
+        Compiles every numba kernel up front (or loads it from the on-disk cache), e.g. once at the start of a
+        scheduled job, so the first fit doesn't pay the JIT compilation.
+        Args:
+            parallel (bool): also compile the kernel of mp_compute_nested_fits(backend="numba")
+        Returns:
+            nothing
+        """
+        warmup_kernels(parallel)
+        series = np.vstack((np.arange(9, dtype=np.float64), np.log(np.arange(10.0, 19.0))))
+        # the contiguous matrix and a window sliced out of it compile to different signatures
+        for observations in (np.ascontiguousarray(series[:, 1:]), series[:, 1:]):
+            LPPLS.matrix_equation(observations, 10.0, 0.5, 8.0)
+            LPPLS.lppls(observations[0], 10.0, 0.5, 8.0, 1.0, -1.0, 0.1, 0.1)
+
+    @staticmethod
+    @njit(cache=CACHE)
     def lppls(t, tc, m, w, a, b, c1, c2):
         dt = np.abs(tc - t) + 1e-8
         return a + np.power(dt, m) * (
@@ -41,6 +101,7 @@ class LPPLS(object):
     def func_restricted(self, x, *args):
         """
         Finds the least square difference.
+        Uses the fused compiled kernel which slaves the linear parameters and evaluates the SSE in one pass.
         See https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.minimize.html
         Args:
             x(np.ndarray):  1-D array with shape (n,).
@@ -48,23 +109,38 @@ class LPPLS(object):
         Returns:
             (float)
         """
-        tc = x[0]
-        m = x[1]
-        w = x[2]
         observations = args[0]
+        return restricted_sse(observations, x[0], x[1], x[2])
 
-        rM = self.matrix_equation(observations, tc, m, w)
-        a, b, c1, c2 = rM[:, 0].tolist()
-        # print('type', type(res))
-        # print('func_restricted', res)
+    def func_restricted_grad(self, x, *args):
+        """
+        Analytic gradient of func_restricted with respect to (tc, m, w).
+        Args:
+            x(np.ndarray):  1-D array with shape (n,).
+            args:           Tuple of the fixed parameters needed to completely specify the function.
+        Returns:
+            (np.ndarray) 1-D array with shape (3,)
+        """
+        observations = args[0]
+        _, d_tc, d_m, d_w = restricted_gradient(observations, x[0], x[1], x[2])
+        return np.array([d_tc, d_m, d_w])
 
-        delta = self.lppls(observations[0, :], tc, m, w, a, b, c1, c2)
-        delta = np.subtract(delta, observations[1, :])
-        delta = np.power(delta, 2)
-        return np.sum(delta)
+    def func_restricted_hess(self, x, *args):
+        """
+        Gauss-Newton approximation 2 J'J of the hessian of func_restricted, where J is the variable
+        projection Jacobian of the residuals.
+        Args:
+            x(np.ndarray):  1-D array with shape (n,).
+            args:           Tuple of the fixed parameters needed to completely specify the function.
+        Returns:
+            (np.ndarray) 2-D array with shape (3, 3)
+        """
+        observations = args[0]
+        _, jac = restricted_jacobian(observations, x[0], x[1], x[2])
+        return 2.0 * jac.T @ jac
 
     @staticmethod
-    @njit
+    @njit(cache=CACHE)
     def matrix_equation(observations, tc, m, w):
         """
         Derive linear parameters in LPPLs from nonlinear ones.
@@ -110,54 +186,210 @@ class LPPLS(object):
 
         return np.linalg.solve(matrix_1, matrix_2)
 
-    def fit(self, max_searches, minimizer="Nelder-Mead", obs=None):
+    def evaluate_candidates(self, params, obs=None):
+        """
+        Scores a batch of non-linear parameter candidates in a single compiled call.
+        Args:
+            params (Kx3 numpy array): candidate (tc, m, w) triples.
+            obs (Mx2 numpy array): the observed time-series data. Optional, if not included will use self.observations
+        Returns:
+            sse (K numpy array), lin (Kx4 numpy array of a, b, c1, c2)
+        """
+        if obs is None:
+            obs = self.observations
+        params = np.ascontiguousarray(params, dtype=np.float64).reshape(-1, 3)
+        return evaluate_candidates(np.asarray(obs, dtype=np.float64), params)
+
+    def fit(self, max_searches, minimizer="Nelder-Mead", obs=None, seeding="random", init_limits=None, seed=None):
         """
         Args:
             max_searches (int): The maxi amount of searches to perform before giving up. The literature suggests 25.
             minimizer (str): See list of valid methods to pass to scipy.optimize.minimize:
                 https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.minimize.html#scipy.optimize.minimize
+                Gradient based methods such as "L-BFGS-B" or "trust-constr" use analytic derivatives, see estimate_params.
+                The unbounded hessian methods ("newton-cg", "dogleg", "trust-ncg", "trust-krylov", "trust-exact")
+                are not supported.
+                "numba-nelder-mead" and "numba-lm" run a compiled Nelder-Mead / Levenberg-Marquardt instead.
             obs (Mx2 numpy array): the observed time-series data. Optional, if not included will use self.scaled_obs
+            seeding (str): how the initial values of the local searches are chosen.
+                "random": uniform random draws inside init_limits (default).
+                "grid": score a coarse (tc, m, w) lattice and start from its best points.
+                "sobol": score a quasi-random Sobol sample and start from its best points.
+                The "grid" and "sobol" modes are deterministic.
+                A Kx3 array of (tc, m, w) seeds is tried in order.
+            init_limits (list): [(tc_min, tc_max), (m_min, m_max), (w_min, w_max)] search box for the seeds.
+                Optional, if not included will use self._get_init_limits(obs)
+            seed (list): (tc, m, w) warm start, e.g. the solution of a neighbouring window. Optional, if included
+                the first search starts from it and the remaining max_searches - 1 searches use `seeding`.
         Returns:
             tc, m, w, a, b, c, c1, c2, O, D
         """
         if obs is None:
             obs = self.observations
 
-        search_count = 0
-        # find bubble
-        while search_count < max_searches:
-            # tc_init_min, tc_init_max = self._get_tc_bounds(obs, 0.50, 0.50)
-            t1 = obs[0, 0]
-            t2 = obs[0, -1]
-
-            # @TODO make configurable
-            # set random initialization limits for non-linear params
-            init_limits = [
-                # (tc_init_min, tc_init_max),
-                (t2 - 0.2 * (t2 - t1), t2 + 0.2 * (t2 - t1)),  # tc
-                (0.1, 1.0),  # m
-                (6.0, 13.0),  # ω
-            ]
+        t1 = obs[0, 0]
+        t2 = obs[0, -1]
 
-            # randomly choose vals within bounds for non-linear params
-            non_lin_vals = [random.uniform(a[0], a[1]) for a in init_limits]
+        if init_limits is None:
+            init_limits = self._get_init_limits(obs)
+        # raise here, errors in the searches below only count as failed searches
+        self._get_compiled_minimizer(minimizer)
 
-            tc = non_lin_vals[0]
-            m = non_lin_vals[1]
-            w = non_lin_vals[2]
-            seed = np.array([tc, m, w])
+        seeds = self._get_seeds(obs, max_searches, seeding, init_limits)
+        if seed is not None and max_searches > 0:
+            seeds = chain([np.asarray(seed, dtype=np.float64)], islice(seeds, max_searches - 1))
 
-            # Increment search count on SVD convergence error, but raise all other exceptions.
+        # find bubble
+        for x0 in seeds:
+            # Move on to the next seed on SVD convergence error or unsuccessful minimization.
             try:
-                tc, m, w, a, b, c, c1, c2 = self.estimate_params(obs, seed, minimizer)
+                tc, m, w, a, b, c, c1, c2 = self.estimate_params(obs, x0, minimizer)
                 O = self.get_oscillations(w, tc, t1, t2)
                 D = self.get_damping(m, w, b, c)
                 return tc, m, w, a, b, c, c1, c2, O, D
             except Exception as e:
                 # print(e)
-                search_count += 1
+                continue
         return 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
 
+    def _get_init_limits(self, obs):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+        Returns:
+            [(tc_min, tc_max), (m_min, m_max), (w_min, w_max)] initialization limits for the non-linear params
+        """
+        # tc_init_min, tc_init_max = self._get_tc_bounds(obs, 0.50, 0.50)
+        t1 = obs[0, 0]
+        t2 = obs[0, -1]
+        return [
+            # (tc_init_min, tc_init_max),
+            (t2 - 0.2 * (t2 - t1), t2 + 0.2 * (t2 - t1)),  # tc
+            (0.1, 1.0),  # m
+            (6.0, 13.0),  # ω
+        ]
+
+    def _get_search_bounds(self, obs):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+        Returns:
+            [(tc_min, tc_max), (m_min, m_max), (w_min, w_max)] bounds of the local searches of the bounded
+            scipy minimizers, wider than _get_init_limits so a search isn't stopped at the edge of the seed box
+        """
+        t1 = obs[0, 0]
+        t2 = obs[0, -1]
+        return [
+            (t2 - 0.5 * (t2 - t1), t2 + 0.5 * (t2 - t1)),  # tc
+            (0.01, 1.0),  # m
+            (2.0, 25.0),  # ω
+        ]
+
+    def _get_seeds(self, obs, max_searches, seeding, init_limits):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+            max_searches (int): the number of seeds to return
+            seeding (str or np.ndarray): "random", "grid", "sobol" or an array of seeds, see fit
+            init_limits (list): [(tc_min, tc_max), (m_min, m_max), (w_min, w_max)]
+        Returns:
+            iterable of at most max_searches (tc, m, w) seeds, in the order they should be tried
+        """
+        if not isinstance(seeding, str):
+            return np.asarray(seeding, dtype=np.float64).reshape(-1, 3)[:max_searches]
+        if seeding == "random":
+            # randomly choose vals within bounds for non-linear params
+            # drawn lazily so a successful early search doesn't consume random numbers for the others
+            return (
+                np.array([random.uniform(a[0], a[1]) for a in init_limits]) for _ in range(max_searches)
+            )
+
+        candidates = self._get_seed_candidates(seeding, init_limits)
+        return candidates[self._rank_candidates(self._score_candidates(obs, candidates))[:max_searches]]
+
+    def _get_seed_candidates(self, seeding, init_limits, tc_density=1.0):
+        """
+        Args:
+            seeding (str): "grid" or "sobol", see fit
+            init_limits (list): [(tc_min, tc_max), (m_min, m_max), (w_min, w_max)]
+            tc_density (float): draws about tc_density times as many candidates along tc, so a sub-range of tc
+                1 / tc_density as wide still holds as many as the default
+        Returns:
+            (np.ndarray) Kx3 array of the (tc, m, w) candidates scored by the seeding mode
+        """
+        lower = np.array([a[0] for a in init_limits], dtype=np.float64)
+        upper = np.array([a[1] for a in init_limits], dtype=np.float64)
+        if seeding == "grid":
+            n_tc, n_m, n_w = self.SEED_GRID_SHAPE
+            n_tc = int(np.ceil((n_tc - 1) * tc_density)) + 1
+            axes = [np.linspace(0.0, 1.0, n) for n in (n_tc, n_m, n_w)]
+            unit = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        elif seeding == "sobol":
+            from scipy.stats import qmc
+
+            log2_points = self.SEED_SOBOL_LOG2_POINTS + int(np.ceil(np.log2(tc_density)))
+            unit = qmc.Sobol(d=3, scramble=False).random_base2(log2_points)
+        else:
+            raise ValueError(f"Unknown seeding: {seeding}, expected one of 'random', 'grid' or 'sobol'")
+        return lower + unit * (upper - lower)
+
+    def _score_candidates(self, obs, candidates):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+            candidates (np.ndarray): Kx3 array of (tc, m, w)
+        Returns:
+            (np.ndarray) K values of the objective minimized by fit, np.inf where it can't be evaluated
+        """
+        sse, _ = evaluate_candidates(np.asarray(obs, dtype=np.float64), candidates)
+        return sse
+
+    def _get_nested_seeds(self, obs, offsets, max_searches, seeding):
+        """
+        Ranks the "grid" or "sobol" candidates of every shrinking window obs[:, j:] in one compiled pass, see
+        kernels.evaluate_nested_candidates, instead of scoring the candidates of each window separately. The
+        candidates are drawn once in the init limits of the whole window, densely enough along tc that the
+        smallest window keeps as many as fit would draw for it, and each window ranks those inside its own limits.
+        Args:
+            obs (Mx2 numpy array): the observed data of the outer window
+            offsets (list): start index j of every shrinking window
+            max_searches (int): the number of seeds to keep per window
+            seeding (str or np.ndarray): see fit
+        Returns:
+            list of Kx3 arrays of seeds, best first, one per shrinking window, or None if the seeds can't be shared,
+            i.e. for the "random" and explicit seeds or an objective other than the SSE of _score_candidates
+        """
+        if (
+            not isinstance(seeding, str)
+            or seeding == "random"
+            or type(self)._score_candidates is not LPPLS._score_candidates
+            or len(offsets) == 0
+        ):
+            return None
+        obs = np.ascontiguousarray(obs, dtype=np.float64)
+        limits = [self._get_init_limits(obs[:, j:])[0] for j in offsets]
+        width = obs[0, -1] - obs[0, 0]
+        smallest = obs[0, -1] - obs[0, max(offsets)]
+        tc_density = width / smallest if smallest > 0 else 1.0
+
+        candidates = self._get_seed_candidates(seeding, self._get_init_limits(obs), tc_density)
+        sse, _ = evaluate_nested_candidates(obs, candidates, np.asarray(offsets, dtype=np.int64))
+        seeds = []
+        for k, (tc_min, tc_max) in enumerate(limits):
+            score = np.where((tc_min <= candidates[:, 0]) & (candidates[:, 0] <= tc_max), sse[:, k], np.inf)
+            seeds.append(candidates[self._rank_candidates(score)[:max_searches]])
+        return seeds
+
+    @staticmethod
+    def _rank_candidates(score):
+        """
+        Returns:
+            (np.ndarray) indices of the candidates with a finite score, best first
+        """
+        # stable sort keeps the lattice order between ties, so the seeds are reproducible
+        order = np.argsort(score, kind="stable")
+        return order[np.isfinite(score[order])]
+
     def estimate_params(self, observations, seed, minimizer):
         """
         Args:
@@ -165,18 +397,44 @@ class LPPLS(object):
             seed (list):  time-critical, omega, and m.
             minimizer (str):  See list of valid methods to pass to scipy.optimize.minimize:
                 https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.minimize.html#scipy.optimize.minimize
+                Gradient based methods (e.g. L-BFGS-B, BFGS, trust-constr) get the analytic gradient, and the
+                Gauss-Newton hessian where the method needs one. L-BFGS-B, TNC, SLSQP and trust-constr search
+                inside self._get_search_bounds(observations).
+                "numba-nelder-mead" and "numba-lm" select the compiled optimizers of kernels.minimize_restricted.
         Returns:
             tc, m, w, a, b, c, c1, c2
         """
 
-        cofs = minimize(
-            args=observations, fun=self.func_restricted, x0=seed, method=minimizer
-        )
+        compiled = self._get_compiled_minimizer(minimizer)
+        if compiled is not None:
+            unbounded = np.full(3, np.inf)
+            x, _, success = minimize_restricted(
+                np.asarray(observations, dtype=np.float64),
+                np.asarray(seed, dtype=np.float64),
+                -unbounded,
+                unbounded,
+                compiled,
+            )
+        else:
+            jac = hess = bounds = None
+            method = minimizer.lower() if isinstance(minimizer, str) else minimizer
+            if method in BOUNDED_MINIMIZERS:
+                bounds = self._get_search_bounds(observations)
+            if self.func_restricted_grad is not None and method in JAC_MINIMIZERS:
+                jac = self.func_restricted_grad
+                if self.func_restricted_hess is not None and method in HESS_MINIMIZERS:
+                    hess = self.func_restricted_hess
+
+            cofs = minimize(
+                args=observations, fun=self.func_restricted, x0=seed, method=minimizer, jac=jac, hess=hess,
+                bounds=bounds,
+            )
+            x, success = cofs.x, cofs.success
 
-        if cofs.success:
-            tc = cofs.x[0]
-            m = cofs.x[1]
-            w = cofs.x[2]
+        if success:
+            tc = x[0]
+            m = x[1]
+            w = x[2]
             # r =
             # m_f =
 
@@ -193,6 +451,21 @@ class LPPLS(object):
         else:
             raise UnboundLocalError
 
+    def _get_compiled_minimizer(self, minimizer):
+        """
+        Args:
+            minimizer (str): see fit
+        Returns:
+            (int) the kernels.minimize_restricted code of a compiled minimizer, None for scipy minimizers
+        """
+        method = minimizer.lower() if isinstance(minimizer, str) else None
+        if method in UNBOUNDED_HESS_MINIMIZERS:
+            raise ValueError(f"Unsupported minimizer: {minimizer}, use a bounded method such as 'trust-constr'")
+        compiled = COMPILED_MINIMIZERS.get(method)
+        if compiled is not None and type(self).func_restricted is not LPPLS.func_restricted:
+            raise ValueError(f"The compiled minimizers don't support the objective of {type(self).__name__}")
+        return compiled
+
     def plot_fit(self, show_tc=False):
         """
         Args:
@@ -200,6 +473,9 @@ class LPPLS(object):
         Returns:
             nothing, should plot the fit
         """
+        import matplotlib.dates as mdates
+        from matplotlib import pyplot as plt
+
         tc, m, w, a, b, c, c1, c2 = self.coef_.values()
         time_ord = [
             pd.Timestamp.fromordinal(d) for d in self.observations[0, :].astype("int32")
@@ -245,130 +521,101 @@ class LPPLS(object):
         # fig.autofmt_xdate()
 
     def compute_indicators(self, res, filter_conditions_config=None):
-        pos_lst = []
-        neg_lst = []
-        pos_conf_lst = []
-        neg_conf_lst = []
-        price = []
-        ts = []
-        _fits = []
-
-        if filter_conditions_config is None:
-            # TODO make configurable again!
-            m_min, m_max = (0.0, 1.0)
-            w_min, w_max = (2.0, 15.0)
-            O_min = 2.5
-            D_min = 0.5
-        else:
-            # TODO parse user provided conditions
-            pass
-
-        for r in res:
-            ts.append(r["t2"])
-            price.append(r["p2"])
-            pos_qual_count = 0
-            neg_qual_count = 0
-            pos_count = 0
-            neg_count = 0
-            # _fits.append(r['res'])
-
-            for idx, fits in enumerate(r["res"]):
-                t1 = fits["t1"]
-                t2 = fits["t2"]
-                tc = fits["tc"]
-                m = fits["m"]
-                w = fits["w"]
-                b = fits["b"]
-                c = fits["c"]
-                O = fits["O"]
-                D = fits["D"]
-
-                # t_delta = t2 - t1
-                # pct_delta_min = t_delta * 0.5
-                # pct_delta_max = t_delta * 0.5
-                # tc_min = t2 - pct_delta_min
-                # tc_max = t2 + pct_delta_max
-
-                # [max(t2 - 60, t2 - 0.5 * (t2 - t1)), min(252, t2 + 0.5 * (t2 - t1))]
-
-                # print('lb: max({}, {})={}'.format(t2 - 60, t2 - 0.5 * (t2 - t1), max(t2 - 60, t2 - 0.5 * (t2 - t1))))
-                # print('ub: min({}, {})={}'.format(t2 + 252, t2 + 0.5 * (t2 - t1), min(t2 + 252, t2 + 0.5 * (t2 - t1))))
-                #
-                # print('{} < {} < {}'.format(max(t2 - 60, t2 - 0.5 * (t2 - t1)), tc, min(t2 + 252, t2 + 0.5 * (t2 - t1))))
-                # print('______________')
-
-                tc_in_range = (
-                    max(t2 - 60, t2 - 0.5 * (t2 - t1))
-                    < tc
-                    < min(t2 + 252, t2 + 0.5 * (t2 - t1))
-                )
-                m_in_range = m_min < m < m_max
-                w_in_range = w_min < w < w_max
-
-                if b != 0 and c != 0:
-                    O = O
-                else:
-                    O = np.inf
-
-                O_in_range = O > O_min
-                D_in_range = D > D_min  # if m > 0 and w > 0 else False
-
-                if (
-                    tc_in_range
-                    and m_in_range
-                    and w_in_range
-                    and O_in_range
-                    and D_in_range
-                ):
-                    is_qualified = True
-                else:
-                    is_qualified = False
-
-                if b < 0:
-                    pos_count += 1
-                    if is_qualified:
-                        pos_qual_count += 1
-                if b > 0:
-                    neg_count += 1
-                    if is_qualified:
-                        neg_qual_count += 1
-                # add this to res to make life easier
-                r["res"][idx]["is_qualified"] = is_qualified
-
-            _fits.append(r["res"])
-
-            pos_conf = pos_qual_count / pos_count if pos_count > 0 else 0
-            neg_conf = neg_qual_count / neg_count if neg_count > 0 else 0
-            pos_conf_lst.append(pos_conf)
-            neg_conf_lst.append(neg_conf)
-
-            # pos_lst.append(pos_count / (pos_count + neg_count))
-            # neg_lst.append(neg_count / (pos_count + neg_count))
-
-            # tc_lst.append(tc_cnt)
-            # m_lst.append(m_cnt)
-            # w_lst.append(w_cnt)
-            # O_lst.append(O_cnt)
-            # D_lst.append(D_cnt)
+        """
+        Computes the positive and negative bubble confidence indicators.
+        Args:
+            res (list or NestedFits): result from mp_compute_nested_fits
+            filter_conditions_config (dict): conditions a fit must meet to qualify. Optional, missing keys
+                fall back to DEFAULT_FILTER_CONDITIONS:
+                    "m": (m_min, m_max), "w": (w_min, w_max): exclusive bounds of m and ω
+                    "O_min", "D_min": lower bounds of the number of oscillations and the damping
+                    "tc_before", "tc_after", "tc_window_pct": tc must lie within
+                        max(t2 - tc_before, t2 - tc_window_pct * (t2 - t1)) < tc < min(t2 + tc_after, t2 + tc_window_pct * (t2 - t1))
+        Returns:
+            pd.DataFrame with columns time, price, pos_conf, neg_conf and _fits. For a list of dicts _fits
+            holds the dicts of every fit, annotated with "is_qualified". For NestedFits it holds the structured
+            rows of the fits and an extra _is_qualified column holds the boolean qualification per fit.
+        """
+        conditions = self._get_filter_conditions(filter_conditions_config)
+        nested = NestedFits.from_records(res)
+        fits = nested.fits
+
+        t1 = fits["t1"]
+        t2 = fits["t2"]
+        tc = fits["tc"]
+        b = fits["b"]
+        c = fits["c"]
+        t_delta = conditions["tc_window_pct"] * (t2 - t1)
+
+        with np.errstate(invalid="ignore"):
+            tc_in_range = (np.maximum(t2 - conditions["tc_before"], t2 - t_delta) < tc) & (
+                tc < np.minimum(t2 + conditions["tc_after"], t2 + t_delta)
+            )
+            m_in_range = (conditions["m"][0] < fits["m"]) & (fits["m"] < conditions["m"][1])
+            w_in_range = (conditions["w"][0] < fits["w"]) & (fits["w"] < conditions["w"][1])
+            O = np.where((b != 0) & (c != 0), fits["O"], np.inf)
+            O_in_range = O > conditions["O_min"]
+            D_in_range = fits["D"] > conditions["D_min"]  # if m > 0 and w > 0 else False
+
+        is_qualified = tc_in_range & m_in_range & w_in_range & O_in_range & D_in_range
+
+        pos = b < 0
+        neg = b > 0
+        pos_count = pos.sum(axis=1)
+        neg_count = neg.sum(axis=1)
+        pos_qual_count = (pos & is_qualified).sum(axis=1)
+        neg_qual_count = (neg & is_qualified).sum(axis=1)
+        pos_conf = np.divide(pos_qual_count, pos_count, out=np.zeros(len(nested)), where=pos_count > 0)
+        neg_conf = np.divide(neg_qual_count, neg_count, out=np.zeros(len(nested)), where=neg_count > 0)
 
         res_df = pd.DataFrame(
             {
-                "time": ts,
-                "price": price,
-                "pos_conf": pos_conf_lst,
-                "neg_conf": neg_conf_lst,
-                "_fits": _fits,
+                "time": nested.t2,
+                "price": nested.p2,
+                "pos_conf": pos_conf,
+                "neg_conf": neg_conf,
             }
         )
+
+        if isinstance(res, NestedFits):
+            res_df["_fits"] = list(fits)
+            res_df["_is_qualified"] = list(is_qualified)
+        else:
+            # add this to res to make life easier
+            for r, qualified in zip(res, is_qualified.tolist()):
+                for fit, q in zip(r["res"], qualified):
+                    fit["is_qualified"] = q
+            res_df["_fits"] = [r["res"] for r in res]
+
+        if res is self.indicator_result:
+            # kept up to date by append
+            self.indicators = res_df
+            self.indicators_filter_conditions = filter_conditions_config
         return res_df
-        # return ts, price, pos_lst, neg_lst, pos_conf_lst, neg_conf_lst, #tc_lst, m_lst, w_lst, O_lst, D_lst
 
-    def save_confidence_csv(self, res, filepath):
+    def _get_filter_conditions(self, filter_conditions_config):
+        """
+        Args:
+            filter_conditions_config (dict): user provided conditions, see compute_indicators
+        Returns:
+            (dict) DEFAULT_FILTER_CONDITIONS updated with the user provided conditions
+        """
+        conditions = dict(DEFAULT_FILTER_CONDITIONS)
+        if filter_conditions_config:
+            unknown = set(filter_conditions_config) - set(DEFAULT_FILTER_CONDITIONS)
+            if unknown:
+                raise ValueError(
+                    f"Unknown filter conditions: {sorted(unknown)}, expected any of {sorted(DEFAULT_FILTER_CONDITIONS)}"
+                )
+            conditions.update(filter_conditions_config)
+        return conditions
+
+    def save_confidence_csv(self, res, filepath, filter_conditions_config=None):
         """
         Saves confidence indicators to a CSV file.
         Columns: Date, Value, Type (pos/neg)
         """
-        res_df = self.compute_indicators(res)
+        res_df = self.compute_indicators(res, filter_conditions_config)
         
         data = []
         
@@ -400,16 +647,20 @@ class LPPLS(object):
         else:
             print(f"No confidence signals to save for {filepath}")
 
-    def plot_confidence_indicators(self, res):
+    def plot_confidence_indicators(self, res, filter_conditions_config=None):
         """
         Args:
             res (list): result from mp_compute_indicator
+            filter_conditions_config (dict): see compute_indicators
             condition_name (str): the name you assigned to the filter condition in your config
             title (str): super title for both subplots
         Returns:
             nothing, should plot the indicator
         """
-        res_df = self.compute_indicators(res)
+        import matplotlib.dates as mdates
+        from matplotlib import pyplot as plt
+
+        res_df = self.compute_indicators(res, filter_conditions_config)
         fig, (ax1, ax2) = plt.subplots(nrows=2, ncols=1, sharex=True, figsize=(18, 10))
 
         ord = res_df["time"].astype("int32")
@@ -486,34 +737,531 @@ class LPPLS(object):
         inner_increment=2,
         max_searches=25,
         filter_conditions_config={},
+        warm_start=False,
+        minimizer="Nelder-Mead",
+        seeding="random",
+        result_format="records",
+        shared_memory=False,
+        engine=None,
+        backend="process",
+        random_state=None,
+        cache=None,
+        checkpoint=None,
+    ):
+        """
+        Args:
+            workers (int): number of worker processes (or threads for the numba backend)
+            window_size (int): size of the largest (outer) window
+            smallest_window_size (int): the shrinking windows stop before reaching this size
+            outer_increment (int): step between the end dates (t2) of consecutive outer windows
+            inner_increment (int): step between the start dates (t1) of the shrinking windows
+            max_searches (int): see fit
+            filter_conditions_config (dict): unused, see compute_indicators
+            warm_start (bool): seed every fit with the solution of its neighbours instead of starting from scratch.
+                Each shrinking window is seeded with the same window of the previous t2 (or with the previous,
+                larger window of the same t2), falling back to random seeds if the warm started search fails.
+                The outer windows are split into contiguous chunks, one sequential warm started run per chunk.
+                Warm starts pay off most with a gradient based minimizer, e.g. minimizer="L-BFGS-B".
+            minimizer (str): see fit
+            seeding (str): see fit
+            result_format (str): "records" for the legacy list of dicts (one per outer window, see
+                _func_compute_nested_fits), or "array" for a columnar nested_fits.NestedFits.
+                The workers always send back arrays, "records" are built once all windows are done.
+            shared_memory (bool): place the observations in shared memory once and send the workers only the
+                window bounds, instead of pickling a copy of every window with every task.
+            engine (LPPLSEngine): run on the workers of a long-lived engine instead of starting a new pool.
+                Optional, `workers` is ignored if included.
+            backend (str): "process" runs the fits on a pool of worker processes. "numba" runs the whole
+                fit loop (objective, linear solve and a compiled Nelder-Mead) in multi-threaded compiled code,
+                which needs neither pickling nor forking. It supports the LPPLS objective with
+                seeding="random" and minimizer="Nelder-Mead" (or its compiled "numba-nelder-mead") or "numba-lm".
+            random_state (int): seed of the numba backend, the result doesn't depend on the number of threads.
+                Optional, if not included it is drawn from the `random` module like the seeds of fit.
+            cache (fit_cache.FitCache): reuse the fits of outer windows whose observations and settings were
+                already fitted, e.g. by yesterday's run, and only dispatch the others. With random seeding a cached
+                window is reused whatever the state of the random generators. Not supported with warm_start,
+                whose fits depend on the neighbouring windows, nor by the numba backend.
+            checkpoint (checkpoint.FitCheckpoint): write the completed outer windows to a checkpoint file while the
+                run goes on. If the run is killed or a window raises, calling mp_compute_nested_fits again with the
+                same checkpoint, observations and settings only fits the windows that are missing. The file is
+                removed once the run completes. Not supported by the numba backend.
+        Returns:
+            list of dict or NestedFits
+        """
+        assert result_format in ("records", "array"), f"Unknown result_format: {result_format}"
+        assert backend in ("process", "numba"), f"Unknown backend: {backend}"
+        if cache is not None and (warm_start or backend != "process"):
+            raise ValueError("The fit cache is only supported by the process backend without warm_start")
+        if checkpoint is not None and backend != "process":
+            raise ValueError("Checkpoints are only supported by the process backend")
+        if backend == "numba" and random_state is None:
+            random_state = random.getrandbits(31)
+
+        # kept for append, which fits the windows of new bars the same way
+        self.nested_fits_settings = {
+            "window_size": window_size,
+            "smallest_window_size": smallest_window_size,
+            "outer_increment": outer_increment,
+            "inner_increment": inner_increment,
+            "max_searches": max_searches,
+            "warm_start": warm_start,
+            "minimizer": minimizer,
+            "seeding": seeding,
+            "result_format": result_format,
+            "shared_memory": shared_memory,
+            "backend": backend,
+            "random_state": random_state,
+        }
+        settings = {k: v for k, v in self.nested_fits_settings.items() if k != "result_format"}
+        nested = self._compute_nested_fits(0, workers, engine, cache, checkpoint, **settings)
+        return self._set_nested_fits_result(nested, result_format)
+
+    def append(self, observations, workers=None, engine=None, cache=None):
+        """
+        Appends new bars to the observations. If nested fits were computed, only the outer windows ending on the
+        new bars are fitted, with the settings of the last mp_compute_nested_fits call, and indicator_result is
+        extended with them. So are the indicators of the last compute_indicators call on indicator_result.
+        Args:
+            observations (np.ndarray): 2xK matrix with timestamp and observed value of the new bars
+            workers (int): see mp_compute_nested_fits
+            engine (LPPLSEngine): see mp_compute_nested_fits
+            cache (fit_cache.FitCache): see mp_compute_nested_fits
+        Returns:
+            the nested fits of the new outer windows, in the format of indicator_result, or None if no nested fits
+            were computed yet
+        """
+        observations = np.asarray(observations)
+        assert observations.ndim == 2 and observations.shape[0] == 2, (
+            f"Expected a 2xK matrix of new observations, got :{observations.shape}"
+        )
+        n_obs = self.observations.shape[1]
+        self.observations = np.hstack((self.observations, observations))
+        if self.nested_fits_settings is None:
+            return None
+
+        settings = dict(self.nested_fits_settings)
+        result_format = settings.pop("result_format")
+        if cache is not None and (settings["warm_start"] or settings["backend"] != "process"):
+            raise ValueError("The fit cache is only supported by the process backend without warm_start")
+        # the first outer window that ends on a new bar
+        outer_increment = settings["outer_increment"]
+        first_start = max(n_obs - settings["window_size"] + 1, 0)
+        first_start = -(-first_start // outer_increment) * outer_increment
+        nested = self._compute_nested_fits(first_start, workers, engine, cache, None, **settings)
+
+        new_result = nested if result_format == "array" else nested.to_records()
+        if result_format == "array":
+            self.indicator_result = NestedFits.concatenate([self.indicator_result, nested])
+        else:
+            self.indicator_result.extend(new_result)
+
+        if self.indicators is not None:
+            self.indicators = pd.concat(
+                [self.indicators, self.compute_indicators(new_result, self.indicators_filter_conditions)],
+                ignore_index=True,
+            )
+        return new_result
+
+    def _compute_nested_fits(
+        self,
+        first_start,
+        workers,
+        engine,
+        cache,
+        checkpoint,
+        window_size,
+        smallest_window_size,
+        outer_increment,
+        inner_increment,
+        max_searches,
+        warm_start,
+        minimizer,
+        seeding,
+        shared_memory,
+        backend,
+        random_state,
+    ):
+        """
+        Fits the outer windows observations[:, i:i + window_size] for i = first_start, first_start + outer_increment, ...
+        See mp_compute_nested_fits for the other arguments.
+        Returns:
+            NestedFits
+        """
+        if backend == "numba":
+            return self._compute_nested_fits_numba(
+                first_start,
+                workers,
+                window_size,
+                smallest_window_size,
+                outer_increment,
+                inner_increment,
+                max_searches,
+                warm_start,
+                minimizer,
+                seeding,
+                random_state,
+            )
+
+        n_workers = engine.workers if engine is not None else workers or os.cpu_count()
+        starts = list(range(first_start, len(self.observations[0]) - window_size + 1, outer_increment))
+        settings = self._get_cache_settings(
+            window_size, smallest_window_size, inner_increment, max_searches, minimizer, seeding
+        )
+
+        # start index of the outer window -> (t1, t2, p2, fits)
+        fitted = {}
+        if checkpoint is not None:
+            fitted = checkpoint.open(
+                self.observations, dict(settings, outer_increment=outer_increment, warm_start=warm_start)
+            )
+            fitted = {i: fitted[i] for i in starts if i in fitted}
+        cached = set()
+        if cache is not None:
+            keys = {i: cache.key(self.observations[:, i : window_size + i], settings) for i in starts}
+            for i in starts:
+                window = cache.get(keys[i]) if i not in fitted else None
+                if window is not None:
+                    fitted[i] = window
+                    cached.add(i)
+        todo = [i for i in starts if i not in fitted]
+
+        tasks, shm = self._get_nested_fits_tasks(
+            window_size,
+            smallest_window_size,
+            outer_increment,
+            inner_increment,
+            max_searches,
+            warm_start,
+            minimizer,
+            seeding,
+            shared_memory,
+            n_workers,
+            todo,
+        )
+
+        from tqdm import tqdm
+
+        # don't start a pool if every window came from the cache or the checkpoint
+        own_engine = engine is None and len(tasks) > 0
+        try:
+            if own_engine:
+                engine = LPPLSEngine(workers, warmup=False)
+            with engine if own_engine else nullcontext():
+                if checkpoint is None:
+                    windows = list(
+                        tqdm(engine.imap(_run_task, tasks), total=len(tasks))
+                    ) if tasks else []
+                    if warm_start:
+                        windows = [r for chunk in windows for r in chunk]
+                    fitted.update(zip(todo, windows))
+                else:
+                    # record the windows as they complete, in whatever order
+                    tagged_tasks = [(self._get_task_starts(task), task) for task in tasks]
+                    for task_starts, windows in tqdm(
+                        engine.imap_unordered(_run_tagged_task, tagged_tasks), total=len(tagged_tasks)
+                    ):
+                        for i, window in zip(task_starts, windows if warm_start else [windows]):
+                            fitted[i] = window
+                            checkpoint.add(i, window)
+        finally:
+            if checkpoint is not None:
+                checkpoint.flush()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        if cache is not None:
+            for i in starts:
+                if i not in cached:
+                    cache.put(keys[i], fitted[i])
+        if checkpoint is not None:
+            # the run is complete, there is nothing left to resume
+            checkpoint.remove()
+
+        return NestedFits.from_windows([fitted[i] for i in starts])
+
+    @staticmethod
+    def _get_task_starts(task):
+        """
+        Returns:
+            (tuple) start index of the outer windows fitted by a task of _get_nested_fits_tasks
+        """
+        _, method, args = task
+        if method == "_func_compute_nested_fits_chunk":
+            return tuple(a[2] for a in args)
+        return (args[2],)
+
+    def _compute_nested_fits_numba(
+        self,
+        first_start,
+        workers,
+        window_size,
+        smallest_window_size,
+        outer_increment,
+        inner_increment,
+        max_searches,
+        warm_start,
+        minimizer,
+        seeding,
+        random_state,
     ):
+        """
+        mp_compute_nested_fits(backend="numba"), see kernels.nested_fits_parallel.
+        """
+        if type(self).func_restricted is not LPPLS.func_restricted:
+            raise ValueError(f"The numba backend doesn't support the objective of {type(self).__name__}")
+        method = NELDER_MEAD if minimizer == "Nelder-Mead" else self._get_compiled_minimizer(minimizer)
+        if warm_start or method is None or seeding != "random":
+            raise ValueError(
+                "The numba backend only supports warm_start=False, seeding='random' and minimizer='Nelder-Mead', "
+                "'numba-nelder-mead' or 'numba-lm'"
+            )
+
+        obs = np.ascontiguousarray(self.observations, dtype=np.float64)
+        outer_starts = np.arange(first_start, obs.shape[1] - window_size + 1, outer_increment)
+        inner_offsets = np.arange(0, window_size - smallest_window_size, inner_increment)
+        # window k of a full run is seeded with random_state + k, keep that when starting later
+        random_state += first_start // outer_increment
+
+        n_threads = numba.get_num_threads()
+        numba.set_num_threads(min(workers or numba.config.NUMBA_NUM_THREADS, numba.config.NUMBA_NUM_THREADS))
+        try:
+            out = nested_fits_parallel(
+                obs, outer_starts, window_size, inner_offsets, max_searches, random_state, method
+            )
+        finally:
+            numba.set_num_threads(n_threads)
+
+        last = outer_starts + window_size - 1
+        return NestedFits(
+            np.ascontiguousarray(out).view(FIT_DTYPE)[..., 0], obs[0, outer_starts], obs[0, last], obs[1, last]
+        )
+
+    @classmethod
+    def batch_compute_nested_fits(
+        cls,
+        series,
+        workers=None,
+        window_size=80,
+        smallest_window_size=20,
+        outer_increment=5,
+        inner_increment=2,
+        max_searches=25,
+        warm_start=False,
+        minimizer="Nelder-Mead",
+        seeding="random",
+        result_format="records",
+        shared_memory=False,
+        engine=None,
+    ):
+        """
+        Computes the nested fits of many series on one pool. The outer windows of all series are scheduled
+        together, so the workers stay busy until the last window of the last series is done.
+        Args:
+            series (dict): name -> observations (2xM matrix with timestamp and observed value) or LPPLS model.
+                Observations are wrapped in a model of this class.
+            workers (int): number of worker processes, ignored if engine is included
+            engine (LPPLSEngine): run on the workers of a long-lived engine instead of starting a new pool
+            others: see mp_compute_nested_fits
+        Yields:
+            (name, result) for every series as soon as all its windows are done. The result is also stored
+            in the indicator_result of the series' model.
+        """
+        assert result_format in ("records", "array"), f"Unknown result_format: {result_format}"
+        models = {
+            name: s if isinstance(s, LPPLS) else cls(observations=s) for name, s in series.items()
+        }
+        own_engine = engine is None
+        if own_engine:
+            engine = LPPLSEngine(workers, warmup=False)
+
+        from tqdm import tqdm
+
+        shms = {}
+        try:
+            results = {}
+            remaining = {}
+            tagged_tasks = []
+            for name, model in models.items():
+                model.nested_fits_settings = {
+                    "window_size": window_size,
+                    "smallest_window_size": smallest_window_size,
+                    "outer_increment": outer_increment,
+                    "inner_increment": inner_increment,
+                    "max_searches": max_searches,
+                    "warm_start": warm_start,
+                    "minimizer": minimizer,
+                    "seeding": seeding,
+                    "result_format": result_format,
+                    "shared_memory": shared_memory,
+                    "backend": "process",
+                    "random_state": None,
+                }
+                tasks, shms[name] = model._get_nested_fits_tasks(
+                    window_size,
+                    smallest_window_size,
+                    outer_increment,
+                    inner_increment,
+                    max_searches,
+                    warm_start,
+                    minimizer,
+                    seeding,
+                    shared_memory,
+                    engine.workers,
+                )
+                results[name] = [None] * len(tasks)
+                remaining[name] = len(tasks)
+                tagged_tasks.extend(((name, idx), task) for idx, task in enumerate(tasks))
+
+            for name in [name for name, count in remaining.items() if count == 0]:
+                yield name, models[name]._set_nested_fits_result(NestedFits.from_windows([]), result_format)
+
+            for (name, idx), windows in tqdm(
+                engine.imap_unordered(_run_tagged_task, tagged_tasks), total=len(tagged_tasks)
+            ):
+                results[name][idx] = windows
+                remaining[name] -= 1
+                if remaining[name] == 0:
+                    shm = shms.pop(name)
+                    if shm is not None:
+                        shm.close()
+                        shm.unlink()
+                    windows = results.pop(name)
+                    if warm_start:
+                        windows = [r for chunk in windows for r in chunk]
+                    yield name, models[name]._set_nested_fits_result(NestedFits.from_windows(windows), result_format)
+        finally:
+            for shm in shms.values():
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+            if own_engine:
+                # every result has been received unless the caller stopped early
+                engine.terminate()
+
+    def _get_nested_fits_tasks(
+        self,
+        window_size,
+        smallest_window_size,
+        outer_increment,
+        inner_increment,
+        max_searches,
+        warm_start,
+        minimizer,
+        seeding,
+        shared_memory,
+        n_workers,
+        starts=None,
+    ):
+        """
+        Builds the worker tasks of mp_compute_nested_fits.
+        Args:
+            starts (list): start index of the outer windows to fit. Optional, if not included every outer window
+                observations[:, i:i + window_size] with i stepping by outer_increment is fitted.
+        Returns:
+            tasks (list): arguments of engine._run_task, one per outer window (or chunk of outer windows)
+            shm (SharedMemory): the shared observations to release once the tasks are done, or None
+        """
         obs_copy = self.observations
         obs_opy_len = len(obs_copy[0]) - window_size
-        func = self._func_compute_nested_fits
+        method = "_func_compute_nested_fits_array"
 
         # print('obs_copy', obs_copy)
         # print('obs_opy_len', obs_opy_len)
 
+        # the workers rebuild the model from its attributes once per job, the tasks only carry the windows
+        if shared_memory:
+            obs_copy = np.ascontiguousarray(obs_copy, dtype=np.float64)
+            shm = SharedMemory(create=True, size=max(obs_copy.nbytes, 1))
+            np.ndarray(obs_copy.shape, dtype=obs_copy.dtype, buffer=shm.buf)[:] = obs_copy
+            shm_spec = (shm.name, obs_copy.shape, obs_copy.dtype)
+        else:
+            shm = shm_spec = None
+        job = (uuid.uuid4().hex, type(self), self._get_worker_state(), shm_spec)
+
         func_arg_map = [
             (
-                obs_copy[:, i : window_size + i],
+                (i, window_size + i) if shared_memory else obs_copy[:, i : window_size + i],
                 window_size,
                 i,
                 smallest_window_size,
                 outer_increment,
                 inner_increment,
                 max_searches,
+                warm_start,
+                {"minimizer": minimizer, "seeding": seeding},
             )
-            for i in range(0, obs_opy_len + 1, outer_increment)
+            for i in (range(0, obs_opy_len + 1, outer_increment) if starts is None else starts)
         ]
 
-        with Pool(processes=workers) as pool:
-            self.indicator_result = list(
-                tqdm(pool.imap(func, func_arg_map), total=len(func_arg_map))
-            )
+        if warm_start and func_arg_map:
+            # a few chunks per worker keeps the pool busy while each chunk is long enough to profit from warm starts
+            n_chunks = min(len(func_arg_map), n_workers * 4)
+            # a chunk seeds each window from the previous one, so it must not span a gap left by the windows
+            # already fitted (e.g. read from a checkpoint): split into runs of neighbouring windows first
+            gaps = [
+                k for k in range(1, len(func_arg_map)) if func_arg_map[k][2] != func_arg_map[k - 1][2] + outer_increment
+            ]
+            chunks = []
+            for lo, hi in zip([0] + gaps, gaps + [len(func_arg_map)]):
+                run = func_arg_map[lo:hi]
+                bounds = np.linspace(0, len(run), max(1, round(n_chunks * len(run) / len(func_arg_map))) + 1)
+                chunks.extend(run[a:b] for a, b in zip(bounds[:-1].astype(int), bounds[1:].astype(int)))
+            method = "_func_compute_nested_fits_chunk"
+            func_arg_map = chunks
+
+        return [(job, method, args) for args in func_arg_map], shm
 
+    def _set_nested_fits_result(self, nested, result_format):
+        """
+        Stores the NestedFits of mp_compute_nested_fits in self.indicator_result, in the requested format.
+        """
+        self.indicator_result = nested if result_format == "array" else nested.to_records()
+        # indicators of the previous result are stale
+        self.indicators = None
         return self.indicator_result
 
+    def _get_cache_settings(
+        self, window_size, smallest_window_size, inner_increment, max_searches, minimizer, seeding
+    ):
+        """
+        Returns:
+            (dict) everything but the observations that the nested fits of an outer window depend on, see
+            fit_cache.FitCache.key
+        """
+        return {
+            "model": f"{type(self).__module__}.{type(self).__qualname__}",
+            # class level fit settings of the subclasses, e.g. LPPLSCMAES
+            "nested_fit_kwargs": getattr(self, "nested_fit_kwargs", None),
+            "state": self._get_worker_state(),
+            "window_size": window_size,
+            "smallest_window_size": smallest_window_size,
+            "inner_increment": inner_increment,
+            "max_searches": max_searches,
+            "minimizer": minimizer,
+            "seeding": seeding,
+        }
+
+    def _get_worker_state(self):
+        """
+        Returns:
+            (dict) the attributes a worker needs to rebuild this model, without the observations and results
+        """
+        state = {
+            k: v
+            for k, v in self.__dict__.items()
+            if k
+            not in (
+                "observations",
+                "indicator_result",
+                "nested_fits_settings",
+                "indicators",
+                "indicators_filter_conditions",
+            )
+        }
+        state["coef_"] = {}
+        return state
+
     def compute_nested_fits(
         self,
         window_size=80,
@@ -521,40 +1269,112 @@ class LPPLS(object):
         outer_increment=5,
         inner_increment=2,
         max_searches=25,
+        result_format="xarray",
+        workers=None,
     ):
+        """
+        Args:
+            window_size, smallest_window_size, outer_increment, inner_increment, max_searches: see mp_compute_nested_fits
+            result_format (str): "xarray" for an xr.DataArray with dims (t2, windowsizes, params), or "array" for the
+                bare float array with the same layout, which doesn't need xarray.
+            workers (int): fit the outer windows on this many worker processes. Optional, if not included they
+                are fitted one after the other in this process.
+        Returns:
+            xr.DataArray or np.ndarray of shape (n_t2, n_windows, len(NESTED_FITS_PARAMS)), where the windows go from
+            the largest (window_size) to the smallest one
+        """
+        assert result_format in ("xarray", "array"), f"Unknown result_format: {result_format}"
         obs_copy = self.observations
-        obs_copy_len = len(obs_copy[0]) - window_size
-        window_delta = window_size - smallest_window_size
-        res = []
-        i_idx = 0
-        for i in range(0, obs_copy_len + 1, outer_increment):
-            j_idx = 0
-            obs = obs_copy[:, i : window_size + i]
-            t1 = obs[0][0]
-            t2 = obs[0][-1]
-            res.append([])
-            i_idx += 1
-            for j in range(0, window_delta, inner_increment):
-                obs_shrinking_slice = obs[:, j:window_size]
-                tc, m, w, a, b, c, _, _, _, _ = self.fit(
-                    max_searches, obs=obs_shrinking_slice
-                )
-                res[i_idx - 1].append([])
-                j_idx += 1
-                for k in [t2, t1, a, b, c, m, 0, tc]:
-                    res[i_idx - 1][j_idx - 1].append(k)
+        starts = np.arange(0, len(obs_copy[0]) - window_size + 1, outer_increment)
+        offsets = np.arange(0, window_size - smallest_window_size, inner_increment)
+
+        if workers is None:
+            nested = NestedFits.from_windows([
+                self._func_compute_nested_fits_array((
+                    obs_copy[:, i : window_size + i],
+                    window_size,
+                    i,
+                    smallest_window_size,
+                    outer_increment,
+                    inner_increment,
+                    max_searches,
+                    False,
+                    {},
+                ))
+                for i in starts
+            ])
+        else:
+            nested = self._compute_nested_fits(
+                0,
+                workers,
+                None,
+                None,
+                None,
+                window_size=window_size,
+                smallest_window_size=smallest_window_size,
+                outer_increment=outer_increment,
+                inner_increment=inner_increment,
+                max_searches=max_searches,
+                warm_start=False,
+                minimizer="Nelder-Mead",
+                seeding="random",
+                shared_memory=False,
+                backend="process",
+                random_state=None,
+            )
+
+        res = np.zeros((len(starts), len(offsets), len(NESTED_FITS_PARAMS)))
+        if len(nested) > 0:
+            fits = nested.fits
+            for k, name in enumerate(NESTED_FITS_PARAMS):
+                if name == "t2":
+                    res[..., k] = nested.t2[:, None]
+                elif name == "t1":
+                    res[..., k] = nested.t1[:, None]
+                elif name != "0":
+                    res[..., k] = fits[name]
+        if result_format == "array":
+            return res
+
+        import xarray as xr
+
         return xr.DataArray(
             data=res,
             dims=("t2", "windowsizes", "params"),
             coords=dict(
-                t2=obs_copy[0][(window_size - 1) :],
-                windowsizes=range(smallest_window_size, window_size, inner_increment),
-                params=["t2", "t1", "a", "b", "c", "m", "0", "tc"],
+                t2=obs_copy[0][starts + window_size - 1],
+                windowsizes=window_size - offsets,
+                params=list(NESTED_FITS_PARAMS),
             ),
         )
 
-    def _func_compute_nested_fits(self, args):
+    def _func_compute_nested_fits_chunk(self, args_list):
+        """
+        Runs _func_compute_nested_fits_array over consecutive outer windows, seeding each window with the fits
+        of the previous one.
+        """
+        res = []
+        seeds = None
+        for args in args_list:
+            t1, t2, p2, fits = self._func_compute_nested_fits_array(args, seeds=seeds)
+            seeds = list(zip(fits["tc"], fits["m"], fits["w"]))
+            res.append((t1, t2, p2, fits))
+        return res
+
+    def _func_compute_nested_fits(self, args, seeds=None):
+        """
+        Legacy dict based version of _func_compute_nested_fits_array.
+        Returns:
+            {"t1": t1, "t2": t2, "p2": p2, "res": [{"tc": tc, "m": m, ...} for every shrinking window]}
+        """
+        return NestedFits.from_windows([self._func_compute_nested_fits_array(args, seeds=seeds)])[0]
 
+    def _func_compute_nested_fits_array(self, args, seeds=None):
+        """
+        Fits every shrinking window of one outer window.
+        Returns:
+            t1, t2, p2, fits (structured array of nested_fits.FIT_DTYPE with one row per shrinking window)
+        """
         (
             obs,
             window_size,
@@ -563,11 +1383,13 @@ class LPPLS(object):
             outer_increment,
             inner_increment,
             max_searches,
+            warm_start,
+            fit_kwargs,
         ) = args
 
         window_delta = window_size - smallest_window_size
 
-        res = []
+        res = np.empty(len(range(0, window_delta, inner_increment)), dtype=FIT_DTYPE)
 
         # print('obs', obs)
         t1 = obs[0][0]
@@ -591,21 +1413,35 @@ class LPPLS(object):
         #
         # qualified[value] = tc_in_range and m_in_range and w_in_range and O_in_range and D_in_range
 
+        offsets = list(range(0, window_delta, inner_increment))
+        nested_seeds = None
+        if self.__class__.__name__ != "LPPLSCMAES":
+            nested_seeds = self._get_nested_seeds(
+                obs[:, :window_size], offsets, max_searches, fit_kwargs.get("seeding", "random")
+            )
+
         # run n fits on the observation slice.
-        for j in range(0, window_delta, inner_increment):
+        seed = None
+        for idx, j in enumerate(offsets):
             obs_shrinking_slice = obs[:, j:window_size]
 
+            if warm_start and seeds is not None and idx < len(seeds) and seeds[idx][0] != 0:
+                # the same shrinking window of the previous t2
+                seed = seeds[idx]
+
             # fit the model to the data and get back the params
             if self.__class__.__name__ == "LPPLSCMAES":
                 # print('cmaes fit is running!')
-                tc, m, w, a, b, c, c1, c2, O, D = self.fit(
-                    max_iteration=2500, pop_size=4, obs=obs_shrinking_slice
-                )
+                tc, m, w, a, b, c, c1, c2, O, D = self.fit(obs=obs_shrinking_slice, **self.nested_fit_kwargs)
             else:
+                window_kwargs = fit_kwargs if nested_seeds is None else dict(fit_kwargs, seeding=nested_seeds[idx])
                 tc, m, w, a, b, c, c1, c2, O, D = self.fit(
-                    max_searches, obs=obs_shrinking_slice
+                    max_searches, obs=obs_shrinking_slice, seed=seed if warm_start else None, **window_kwargs
                 )
 
+            # the next, smaller window of the same t2 starts from this solution unless the search failed
+            seed = (tc, m, w) if tc != 0 else None
+
             nested_t1 = obs_shrinking_slice[0][0]
             nested_t2 = obs_shrinking_slice[0][-1]
             nested_p1 = obs_shrinking_slice[1][0]
@@ -617,28 +1453,9 @@ class LPPLS(object):
             #     sub_t2 = self.inverse_transform_observations([[sub_t2, sub_p2]])[0, 0]
             #     tc = self.inverse_transform_observations([[tc, 0]])[0, 0]
 
-            res.append(
-                {
-                    # "tc_d": self.ordinal_to_date(tc),
-                    "tc": tc,
-                    "m": m,
-                    "w": w,
-                    "a": a,
-                    "b": b,
-                    "c": c,
-                    "c1": c1,
-                    "c2": c2,
-                    # "t1_d": self.ordinal_to_date(nested_t1),
-                    # "t2_d": self.ordinal_to_date(nested_t2),
-                    "t1": nested_t1,
-                    "t2": nested_t2,
-                    "O": O,
-                    "D": D,
-                }
-            )
+            res[idx] = (tc, m, w, a, b, c, c1, c2, nested_t1, nested_t2, O, D)
 
-        # return {'t1': self.ordinal_to_date(t1), 't2': self.ordinal_to_date(t2), 'p2': p2, 'res': res}
-        return {"t1": t1, "t2": t2, "p2": p2, "res": res}
+        return t1, t2, p2, res
 
     def _get_tc_bounds(self, obs, lower_bound_pct, upper_bound_pct):
         """
@@ -683,7 +1500,7 @@ class LPPLS(object):
         # is limited to approximately 584 years
         try:
             return date.fromordinal(int(ordinal)).strftime("%Y-%m-%d")
-        except (ValueError, OutOfBoundsDatetime):
+        except (ValueError, pd.errors.OutOfBoundsDatetime):
             return str(pd.NaT)
 
     def detect_bubble_start_time_via_lagrange(
@@ -692,100 +1509,240 @@ class LPPLS(object):
             min_window_size: int,
             step_size: int = 1,
             max_searches: int = 25,
+            workers: Optional[int] = None,
+            warm_start: bool = False,
+            engine: Optional[LPPLSEngine] = None,
         ) -> Optional[Dict[str, Any]]:
+        """
+        Finds the start time tau of the bubble ending at the last observation by the Lagrange regularization of
+        the normalized SSE of the windows max_window_size, max_window_size - step_size, ..., min_window_size.
+        Args:
+            max_window_size (int): size of the largest window, all windows end at the last observation
+            min_window_size (int): size of the smallest window
+            step_size (int): step between the window sizes
+            max_searches (int): see fit, LPPLSCMAES fits with its nested_fit_kwargs instead
+            workers (int): fit the window sizes on this many worker processes. Optional, if not included they
+                are fitted one after the other in this process.
+            warm_start (bool): seed the fit of every window with the solution of the next larger one, falling back
+                to random seeds if the warm started search fails. With workers, the window sizes are split into
+                contiguous chunks, one warm started run per chunk.
+            engine (LPPLSEngine): run on the workers of a long-lived engine instead of starting a new pool.
+                Optional, `workers` is ignored if included.
+        Returns:
+            dict with tau, the optimal window size and its fit, and the SSE of every fitted window size, or None
+            if fewer than two window sizes could be fitted
+        """
+        total_obs = len(self.observations[0])
+        window_sizes = list(range(max_window_size, min_window_size - 1, -step_size))
+        start_times = [self.observations[0][total_obs - window_size] for window_size in window_sizes]
 
-        window_sizes = []
-        sse_list = []
-        ssen_list = []
-        lagrange_sse_list = []
-        start_times = []
-        n_params = 7 # The number of degrees of freedom used for this exercise as well as for the real-world time series is p = 8, which includes the 7 parameters of the LPPLS model augmented by the extra parameter t1
-
+        if workers is None and engine is None:
+            rows = self._func_lagrange_windows((self.observations, window_sizes, max_searches, warm_start))
+        else:
+            n_workers = engine.workers if engine is not None else workers
+            # a few chunks per worker keeps the pool busy while each chunk is long enough to profit from warm starts
+            n_chunks = min(len(window_sizes), n_workers if warm_start else n_workers * 4)
+            bounds = np.linspace(0, len(window_sizes), n_chunks + 1).astype(int)
+            job = (uuid.uuid4().hex, type(self), self._get_worker_state(), None)
+            tasks = [
+                (
+                    job,
+                    "_func_lagrange_windows",
+                    # the largest window of the chunk holds all the others
+                    (self.observations[:, total_obs - window_sizes[lo]:], window_sizes[lo:hi], max_searches, warm_start),
+                )
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+            ]
+            own_engine = engine is None
+            if own_engine:
+                engine = LPPLSEngine(workers, warmup=False)
+            with engine if own_engine else nullcontext():
+                rows = [row for chunk in engine.imap(_run_task, tasks) for row in chunk]
+
+        res = self._get_lagrange_result(self.observations[0], total_obs, rows)
+        if res is not None:
+            res["start_times"] = start_times
+        return res
+
+    def compute_bubble_start_times(
+            self,
+            max_window_size: int,
+            min_window_size: int,
+            step_size: int = 1,
+            max_searches: int = 25,
+            end_increment: int = 1,
+            workers: Optional[int] = None,
+            warm_start: bool = True,
+            engine: Optional[LPPLSEngine] = None,
+        ) -> pd.DataFrame:
+        """
+        Runs detect_bubble_start_time_via_lagrange as of every end date of the observations, i.e. on
+        observations[:, :end] for end = max_window_size, max_window_size + end_increment, ..., M.
+        Args:
+            max_window_size, min_window_size, step_size, max_searches: see detect_bubble_start_time_via_lagrange
+            end_increment (int): step between consecutive end dates
+            workers (int): fit the end dates on this many worker processes. Optional, if not included they
+                are fitted one after the other in this process.
+            warm_start (bool): seed every window with the fit of the same window size at the previous end date
+                (or with the next larger window of the same end date). With workers, the end dates are split into
+                contiguous chunks, one warm started run per chunk.
+            engine (LPPLSEngine): run on the workers of a long-lived engine instead of starting a new pool.
+                Optional, `workers` is ignored if included.
+        Returns:
+            pd.DataFrame with one row per end date and columns time, price, tau, optimal_window_size, tc, m, w,
+            a, b, c1, c2. The values are NaN for end dates where fewer than two window sizes could be fitted.
+        """
         total_obs = len(self.observations[0])
+        window_sizes = list(range(max_window_size, min_window_size - 1, -step_size))
+        ends = list(range(max_window_size, total_obs + 1, end_increment))
 
-        lppls_params_list = []
+        if workers is None and engine is None:
+            rows = self._func_lagrange_chunk((self.observations, ends, window_sizes, max_searches, warm_start))
+        else:
+            n_workers = engine.workers if engine is not None else workers
+            # a few chunks per worker keeps the pool busy while each chunk is long enough to profit from warm starts
+            n_chunks = min(len(ends), n_workers * 4)
+            bounds = np.linspace(0, len(ends), n_chunks + 1).astype(int)
+            job = (uuid.uuid4().hex, type(self), self._get_worker_state(), None)
+            tasks = []
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                # the observations of the chunk start with the largest window of its first end date
+                offset = ends[lo] - max_window_size
+                chunk_ends = [end - offset for end in ends[lo:hi]]
+                tasks.append((
+                    job,
+                    "_func_lagrange_chunk",
+                    (self.observations[:, offset:ends[hi - 1]], chunk_ends, window_sizes, max_searches, warm_start),
+                ))
+
+            from tqdm import tqdm
+
+            own_engine = engine is None
+            if own_engine:
+                engine = LPPLSEngine(workers, warmup=False)
+            with engine if own_engine else nullcontext():
+                rows = [r for chunk in tqdm(engine.imap(_run_task, tasks), total=len(tasks)) for r in chunk]
+
+        columns = ["tau", "optimal_window_size", "tc", "m", "w", "a", "b", "c1", "c2"]
+        values = np.full((len(ends), len(columns)), np.nan)
+        for idx, (end, end_rows) in enumerate(zip(ends, rows)):
+            if len(end_rows) >= 2:
+                res = self._get_lagrange_result(self.observations[0], end, end_rows)
+                values[idx] = [res[column] for column in columns]
+
+        ends = np.array(ends, dtype=int)
+        res_df = pd.DataFrame(values, columns=columns)
+        res_df.insert(0, "time", self.observations[0][ends - 1])
+        res_df.insert(1, "price", self.observations[1][ends - 1])
+        return res_df
 
-        for window_size in range(max_window_size, min_window_size - 1, -step_size):
-            start_idx = total_obs - window_size
-            end_idx = total_obs
-            obs_window = self.observations[:, start_idx:end_idx]
+    def _func_lagrange_chunk(self, args):
+        """
+        Runs _func_lagrange_windows at consecutive end dates, seeding each end date with the fits of the previous one.
+        Args:
+            args (tuple): (obs, ends, window_sizes, max_searches, warm_start), the windows of an end date end are
+                obs[:, end - window_size:end]
+        Returns:
+            list with the rows of _func_lagrange_windows for every end date
+        """
+        obs, ends, window_sizes, max_searches, warm_start = args
+        res = []
+        seeds = None
+        for end in ends:
+            rows = self._func_lagrange_windows((obs[:, :end], window_sizes, max_searches, warm_start), seeds=seeds)
+            seeds = {row[0]: row[2:5] for row in rows}
+            res.append(rows)
+        return res
+
+    def _func_lagrange_windows(self, args, seeds=None):
+        """
+        Fits the windows of detect_bubble_start_time_via_lagrange.
+        Args:
+            args (tuple): (obs, window_sizes, max_searches, warm_start), the windows obs[:, -window_size:] are
+                fitted in the order of window_sizes
+            seeds (dict): window size -> (tc, m, w) warm start, e.g. the fits of the previous end date. Optional,
+                used with warm_start before the solution of the next larger window.
+        Returns:
+            list of (window_size, sse, tc, m, w, a, b, c1, c2) for the windows that could be fitted
+        """
+        obs, window_sizes, max_searches, warm_start = args
 
-            start_time = self.observations[0][start_idx]
-            start_times.append(start_time)
-            t2 = self.observations[0][end_idx - 1]
+        rows = []
+        seed = None
+        for window_size in window_sizes:
+            if window_size - LAGRANGE_N_PARAMS <= 0:
+                continue  # avoid division by zero or negative degrees of freedom
+            obs_window = obs[:, obs.shape[1] - window_size:]
+            if warm_start and seeds is not None and window_size in seeds:
+                seed = seeds[window_size]
 
             try:
-                tc, m, w, a, b, _, c1, c2, _, _ = self.fit(max_searches, obs=obs_window)
+                if self.__class__.__name__ == "LPPLSCMAES":
+                    tc, m, w, a, b, _, c1, c2, _, _ = self.fit(
+                        obs=obs_window, seed=seed if warm_start else None, **self.nested_fit_kwargs
+                    )
+                else:
+                    tc, m, w, a, b, _, c1, c2, _, _ = self.fit(
+                        max_searches, obs=obs_window, seed=seed if warm_start else None
+                    )
+                seed = (tc, m, w) if tc != 0.0 else None
                 if tc == 0.0:
-                    continue 
+                    continue
 
                 # compute predictions and residuals
                 Yhat = self.lppls(obs_window[0], tc, m, w, a, b, c1, c2)
                 residuals = obs_window[1] - Yhat
-
-                # compute SSE and normalized SSE
-                sse = np.sum(residuals ** 2)
-                n = len(obs_window[0])
-                if n - n_params <= 0:
-                    continue  # avoid division by zero or negative degrees of freedom
-                ssen = sse / (n - n_params)
-
-                window_sizes.append(window_size)
-                sse_list.append(sse)
-                ssen_list.append(ssen)
-                lppls_params_list.append({
-                    'tc': tc,
-                    'm': m,
-                    'w': w,
-                    'a': a,
-                    'b': b,
-                    'c1': c1,
-                    'c2': c2,
-                    'obs_window': obs_window  # may be useful later
-                })
+                rows.append((window_size, np.sum(residuals ** 2), tc, m, w, a, b, c1, c2))
             except Exception as e:
                 print(e)
                 continue
+        return rows
 
-        if len(ssen_list) < 2:
+    def _get_lagrange_result(self, t, end, rows):
+        """
+        Lagrange regularization of the fitted windows of detect_bubble_start_time_via_lagrange.
+        Args:
+            t (np.ndarray): the timestamps of the observations
+            end (int): the windows end at t[end - 1]
+            rows (list): see _func_lagrange_windows
+        Returns:
+            dict, see detect_bubble_start_time_via_lagrange, or None if fewer than two windows were fitted
+        """
+        if len(rows) < 2:
             warnings.warn("Not enough data points to compute Lagrange regularization.")
             return None
 
-        window_sizes_np = np.array(window_sizes).reshape(-1, 1)
-        ssen_list_np = np.array(ssen_list)
+        window_sizes = [int(row[0]) for row in rows]
+        sse_list = [float(row[1]) for row in rows]
+        window_sizes_np = np.array(window_sizes, dtype=np.float64)
+        ssen_np = np.array(sse_list) / (window_sizes_np - LAGRANGE_N_PARAMS)
 
-        # fit linear regression to normalized SSE vs. window sizes
-        reg = LinearRegression().fit(window_sizes_np, ssen_list_np)
-        slope = reg.coef_[0]
-        intercept = reg.intercept_
+        # least squares slope of the normalized SSE vs. window sizes
+        x = window_sizes_np - window_sizes_np.mean()
+        slope = np.dot(x, ssen_np - ssen_np.mean()) / np.dot(x, x)
 
         # compute Lagrange-regularized SSE
-        for i in range(len(sse_list)):
-            lagrange_sse = ssen_list[i] - slope * window_sizes[i]
-            lagrange_sse_list.append(lagrange_sse)
+        lagrange_sse_np = ssen_np - slope * window_sizes_np
 
         # find the optimal window size
-        min_index = np.argmin(lagrange_sse_list)
-        optimal_window_size = window_sizes[min_index]
-        optimal_params = lppls_params_list[min_index]  # get LPPLS parameters for optimal window
+        min_index = int(np.argmin(lagrange_sse_np))
+        optimal_window_size, _, tc, m, w, a, b, c1, c2 = rows[min_index]
 
         # get tau (start time of the bubble)
-        tau_idx = total_obs - optimal_window_size
-        tau = self.observations[0][tau_idx]
+        tau = t[end - optimal_window_size]
 
         return {
             "tau": tau,
             "optimal_window_size": optimal_window_size,
-            "tc": optimal_params['tc'],
-            "m": optimal_params['m'],
-            "w": optimal_params['w'],
-            "a": optimal_params['a'],
-            "b": optimal_params['b'],
-            "c1": optimal_params['c1'],
-            "c2": optimal_params['c2'],
+            "tc": tc,
+            "m": m,
+            "w": w,
+            "a": a,
+            "b": b,
+            "c1": c1,
+            "c2": c2,
             "window_sizes": window_sizes,
             "sse_list": sse_list,
-            "ssen_list": ssen_list,
-            "lagrange_sse_list": lagrange_sse_list,
-            "start_times": start_times
+            "ssen_list": ssen_np.tolist(),
+            "lagrange_sse_list": lagrange_sse_np.tolist(),
         }
@@ -1,12 +1,19 @@
 import cma as cm
-from lppls.lppls import LPPLS
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 # import multiprocessing as mp
 import numpy as np
 from scipy.stats import chisquare
 
+from .lppls import LPPLS
+from .kernels import evaluate_chisquare_candidates
+
 
 class LPPLSCMAES(LPPLS):
 
+    # arguments of fit for every nested window of mp_compute_nested_fits, can be overridden per model
+    nested_fit_kwargs = {"max_iteration": 2500, "pop_size": 4, "verbose": False, "stagnation_iterations": 50}
+
     def __init__(self, observations):
         super().__init__(observations)
         self.observations = observations
@@ -43,7 +50,28 @@ class LPPLSCMAES(LPPLS):
         error, _ = chisquare(f_obs=res, f_exp=obs[1, :])
         return error
 
-    def fit(self, max_iteration=1000, factor_sigma=0.1, pop_size=1, obs=None):
+    @staticmethod
+    def _evaluate_population(obs, solutions, executor=None, workers=None):
+        """
+        Fitness of a CMA-ES generation, see kernels.evaluate_chisquare_candidates.
+
+        Args:
+            obs (np.ndarray): 2xM float64 observations
+            solutions (list): the candidates returned by es.ask()
+            executor (ThreadPoolExecutor, optional): split the candidates in one chunk per worker thread
+            workers (int, optional): number of threads of executor
+        Returns:
+            [List]: fitness of every candidate
+        """
+        params = np.asarray(solutions, dtype=np.float64)
+        if executor is None:
+            return evaluate_chisquare_candidates(obs, params).tolist()
+        chunks = np.array_split(params, workers)
+        fitness = executor.map(lambda chunk: evaluate_chisquare_candidates(obs, chunk), chunks)
+        return np.concatenate(list(fitness)).tolist()
+
+    def fit(self, max_iteration=1000, factor_sigma=0.1, pop_size=1, obs=None, verbose=True, max_evaluations=None,
+            stagnation_iterations=None, stagnation_tol=1e-10, workers=None, seed=None):
         """
         Runs the optimazation loop
 
@@ -53,6 +81,17 @@ class LPPLSCMAES(LPPLS):
             pop_size (int, optional): population size for CMA ES
             cores (int, optional): number of parallel runs
             obs ():
+            verbose (bool, optional): log every iteration to disk and stdout (cma's logger and disp). Turn it off
+                in production, the population is then evaluated in one compiled call per iteration.
+            max_evaluations (int, optional): stop after this many fitness evaluations
+            stagnation_iterations (int, optional): stop once the best fitness hasn't improved by more than
+                stagnation_tol (relative) for this many iterations
+            stagnation_tol (float, optional): see stagnation_iterations
+            workers (int, optional): evaluate every generation on this many threads. The compiled fitness releases
+                the GIL, so the threads share the observations and the fit scales with the cores, which pays off
+                for large windows and populations.
+            seed (list, optional): (tc, m, w) to start the search from instead of the best guess, e.g. the solution
+                of a neighbouring window, clipped to the bounds
         Returns:
             [List]: all optimized and calculated values for tc, m, w, a, b, c, c1, c2
         """
@@ -73,16 +112,42 @@ class LPPLSCMAES(LPPLS):
         opts.set('CMA_stds', [factor_sigma * tc, factor_sigma * (0.9 - 0.1), factor_sigma * (13. - 6.)])
         opts.set('bounds', [(tc, 0.1, 6.), (np.inf, 0.9, 13.)])
         opts.set('popsize', 10 * 2 ** pop_size)
+        if max_evaluations is not None:
+            opts.set('maxfevals', max_evaluations)
+        if not verbose:
+            opts.set('verbose', -9)
+            opts.set('verb_log', 0)
+            opts.set('verb_disp', 0)
+
+        x0 = [tc, m, w]
+        if seed is not None:
+            x0 = np.clip(np.asarray(seed, dtype=np.float64), [tc, 0.1, 6.], [np.inf, 0.9, 13.]).tolist()
 
-        es = cm.CMAEvolutionStrategy(x0=[tc, m, w], sigma0=1., inopts=opts)
+        es = cm.CMAEvolutionStrategy(x0=x0, sigma0=1., inopts=opts)
+        obs_array = np.asarray(obs, dtype=np.float64)
 
         # here we go
-        while not es.stop() and es.countiter <= max_iteration:
-            solutions = es.ask()
-            solution = [self.fun_restricted(s, obs) for s in solutions]
-            es.tell(solutions, solution)
-            es.logger.add()  # write data to disc to be plotted
-            es.disp()
+        best = np.inf
+        last_improvement = 0
+        with ThreadPoolExecutor(workers) if workers else nullcontext() as executor:
+            while not es.stop() and es.countiter <= max_iteration:
+                solutions = es.ask()
+                if verbose and executor is None:
+                    solution = [self.fun_restricted(s, obs) for s in solutions]
+                else:
+                    solution = self._evaluate_population(obs_array, solutions, executor, workers)
+                es.tell(solutions, solution)
+                if verbose:
+                    es.logger.add()  # write data to disc to be plotted
+                    es.disp()
+
+                if stagnation_iterations is not None:
+                    generation_best = min(solution)
+                    if not np.isfinite(best) or generation_best < best - stagnation_tol * abs(best):
+                        best = generation_best
+                        last_improvement = es.countiter
+                    elif es.countiter - last_improvement >= stagnation_iterations:
+                        break
 
         # after while loop print infos and plot the final
         # es.result_pretty()
@@ -1,22 +1,32 @@
 import numpy as np
 from scipy.optimize import least_squares
-from lppls.lppls import LPPLS
+
+from .lppls import LPPLS
+from .kernels import restricted_jacobian, restricted_residuals
 
 
 class LPPLS_LM(LPPLS):
-    
+    """
+    LPPLS fitted with scipy's Levenberg-Marquardt on the residuals of the reduced (tc, m, w) problem.
+
+    Works with mp_compute_nested_fits like the base class, e.g. with warm_start=True every window is
+    seeded with the solution of its neighbour, which suits the local LM search.
+    """
+
     def func_restricted(self, x, obs):
-        tc = x[0]
-        m = x[1]
-        w = x[2]
+        """
+        Residuals (model minus observed) with the linear parameters slaved to (tc, m, w), computed in one
+        compiled pass, see kernels.restricted_residuals.
+        """
+        return restricted_residuals(obs, x[0], x[1], x[2])
 
-        rM = self.matrix_equation(obs, tc, m, w)
-        a, b, c1, c2 = rM[:, 0].tolist()
+    def jac_restricted(self, x, obs):
+        """
+        Analytic (variable projection) Jacobian of func_restricted with respect to (tc, m, w).
+        """
+        _, jac = restricted_jacobian(obs, x[0], x[1], x[2])
+        return jac
 
-        delta = [self.lppls(t, tc, m, w, a, b, c1, c2) for t in obs[0, :]]
-        residuals = np.subtract(delta, obs[1, :])
-        return residuals  # return the array of residuals
-        
     def estimate_params(self, observations, seed, minimizer=None):
         """
         Overrides the estimate_params method to use least_squares with 'lm' method.
@@ -26,12 +36,17 @@ class LPPLS_LM(LPPLS):
         Returns:
             tc, m, w, a, b, c, c1, c2
         """
+        observations = np.asarray(observations, dtype=np.float64)
+
         # Define a wrapper function for least_squares
         def wrapper(x):
             return self.func_restricted(x, observations)
 
+        def jac_wrapper(x):
+            return self.jac_restricted(x, observations)
+
         # Use least_squares with the Levenberg-Marquardt method
-        result = least_squares(wrapper, seed, method='lm')
+        result = least_squares(wrapper, seed, jac=jac_wrapper, method='lm')
 
         if result.success:
             tc, m, w = result.x
@@ -1,35 +1,95 @@
-from lppls.lppls import LPPLS
 import numpy as np
 
+from .lppls import LPPLS
+from .kernels import evaluate_quantile_candidates, quantile_fit, quantile_loss
+
 
 class QLPPLS(LPPLS):
+    # the pinball loss has no analytic derivatives, let scipy approximate them when needed
+    func_restricted_grad = None
+    func_restricted_hess = None
+
     def __init__(self, observations, q=0.5):
         super().__init__(observations)
         self.q = q
 
     def func_restricted(self, x, *args):
         """
-        Finds the least absolute differences adjusted for the q-dependent loss function.
+        Finds the q-dependent pinball loss of the residuals, i.e. q * r for r >= 0 and (q - 1) * r for r < 0,
+        where r = observed - fitted and the linear parameters minimize that same loss.
+        Uses the compiled kernel, see kernels.quantile_fit.
         Args:
             x(np.ndarray):  1-D array with shape (n,).
             args: Tuple of the fixed parameters needed to completely specify the function.
         Returns:
             (float)
         """
-
-        tc = x[0]
-        m = x[1]
-        w = x[2]
         observations = args[0]
+        return quantile_loss(np.asarray(observations, dtype=np.float64), x[0], x[1], x[2], self.q)
 
-        rM = self.matrix_equation(observations, tc, m, w)
-        a, b, c1, c2 = rM[:, 0].tolist()
+    def matrix_equation(self, observations, tc, m, w):
+        """
+        Derive the linear parameters from the nonlinear ones under the pinball loss of self.q, instead of
+        least squares, so estimate_params returns the linear parameters of the quantile fit.
+        Returns:
+            (np.ndarray) 4x1 array of a, b, c1, c2
+        """
+        _, a, b, c1, c2 = quantile_fit(np.asarray(observations, dtype=np.float64), tc, m, w, self.q)
+        if not np.isfinite(a):
+            raise np.linalg.LinAlgError("Singular matrix")
+        return np.array([[a], [b], [c1], [c2]])
 
-        delta = [self.lppls(t, tc, m, w, a, b, c1, c2) for t in observations[0, :]]
-        delta = np.subtract(delta, observations[1, :])
+    def _score_candidates(self, obs, candidates):
+        """
+        Scores the seed candidates with the pinball loss of self.q instead of the SSE.
+        """
+        loss = evaluate_quantile_candidates(
+            np.asarray(obs, dtype=np.float64), candidates, np.array([self.q], dtype=np.float64)
+        )
+        return loss[:, 0]
+
+    def fit_quantiles(self, quantiles, max_searches, minimizer="Nelder-Mead", obs=None, seeding="sobol",
+                      init_limits=None):
+        """
+        Fits several quantiles on the same window. The seed candidates are scored for every quantile in one
+        compiled pass, the basis of a candidate is built once and shared by the quantiles. The quantiles are fitted in
+        ascending order, each one first searching from the solution of the previous quantile and then from
+        its best candidates.
+        Args:
+            quantiles (list): quantiles in (0, 1), e.g. np.arange(0.05, 1.0, 0.05)
+            max_searches (int): see fit, per quantile
+            minimizer (str): see fit
+            obs (Mx2 numpy array): the observed time-series data. Optional, if not included will use self.observations
+            seeding (str): "grid" or "sobol", see fit
+            init_limits (list): see fit
+        Returns:
+            dict q -> (tc, m, w, a, b, c, c1, c2, O, D), self.q is left unchanged
+        """
+        if obs is None:
+            obs = self.observations
+        if init_limits is None:
+            init_limits = self._get_init_limits(obs)
+        quantiles = np.sort(np.asarray(quantiles, dtype=np.float64))
 
-        # Use the L1 norm (sum of absolute differences) instead of the L2 norm
-        # Apply the q-dependent loss function using the given quantile
-        loss = np.sum([-(1 - self.q) * e if e < 0 else self.q * e for e in np.abs(delta)])
+        candidates = self._get_seed_candidates(seeding, init_limits)
+        loss = evaluate_quantile_candidates(np.asarray(obs, dtype=np.float64), candidates, quantiles)
 
-        return loss
\ No newline at end of file
+        res = {}
+        seed = None
+        q = self.q
+        try:
+            for j, quantile in enumerate(quantiles.tolist()):
+                self.q = quantile
+                res[quantile] = self.fit(
+                    max_searches,
+                    minimizer,
+                    obs=obs,
+                    seeding=candidates[self._rank_candidates(loss[:, j])],
+                    init_limits=init_limits,
+                    seed=seed,
+                )
+                # the next quantile starts from this solution unless the search failed
+                seed = res[quantile][:3] if res[quantile][0] != 0 else None
+        finally:
+            self.q = q
+        return res
@@ -0,0 +1,117 @@
+import numpy as np
+
+# parameters stored for every nested fit, in the order of the legacy result dicts
+FIT_FIELDS = ("tc", "m", "w", "a", "b", "c", "c1", "c2", "t1", "t2", "O", "D")
+FIT_DTYPE = np.dtype([(name, np.float64) for name in FIT_FIELDS])
+
+
+class NestedFits(object):
+    """
+    Columnar container for the output of the nested fits.
+
+    The fits are stored in a preallocated structured array indexed by (t2, window), where window counts
+    the shrinking windows from the largest one. Indexing or iterating the container gives the legacy
+    {"t1", "t2", "p2", "res"} dicts, so it can be used wherever the list of dicts was expected.
+    """
+
+    def __init__(self, fits, t1, t2, p2):
+        """
+        Args:
+            fits (np.ndarray): structured array of FIT_DTYPE with shape (n_t2, n_windows).
+            t1 (np.ndarray): start time of every outer window, shape (n_t2,).
+            t2 (np.ndarray): end time of every outer window, shape (n_t2,).
+            p2 (np.ndarray): observed value at t2 of every outer window, shape (n_t2,).
+        """
+        assert fits.dtype == FIT_DTYPE, f"Expected fits of dtype {FIT_DTYPE}, got :{fits.dtype}"
+        assert fits.ndim == 2, f"Expected fits with shape (n_t2, n_windows), got :{fits.shape}"
+        self.fits = fits
+        self.t1 = np.asarray(t1, dtype=np.float64)
+        self.t2 = np.asarray(t2, dtype=np.float64)
+        self.p2 = np.asarray(p2, dtype=np.float64)
+
+    @classmethod
+    def empty(cls, n_t2, n_windows):
+        """
+        Preallocates a container with every value set to NaN.
+        """
+        fits = np.full((n_t2, n_windows), np.nan, dtype=FIT_DTYPE)
+        nan = np.full(n_t2, np.nan)
+        return cls(fits, nan.copy(), nan.copy(), nan.copy())
+
+    @classmethod
+    def from_windows(cls, windows):
+        """
+        Args:
+            windows (list): (t1, t2, p2, fits) per outer window, where fits is a FIT_DTYPE array of shape
+                (n_windows,) as returned by LPPLS._func_compute_nested_fits_array.
+        """
+        if not windows:
+            return cls.empty(0, 0)
+        t1, t2, p2, fits = zip(*windows)
+        return cls(np.stack(fits), t1, t2, p2)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Converts the legacy list of {"t1", "t2", "p2", "res"} dicts.
+        """
+        if isinstance(records, cls):
+            return records
+        if not records:
+            return cls.empty(0, 0)
+        fits = np.array(
+            [[tuple(fit[name] for name in FIT_FIELDS) for fit in r["res"]] for r in records],
+            dtype=FIT_DTYPE,
+        )
+        return cls(
+            fits.reshape(len(records), -1),
+            [r["t1"] for r in records],
+            [r["t2"] for r in records],
+            [r["p2"] for r in records],
+        )
+
+    @classmethod
+    def concatenate(cls, items):
+        """
+        Stacks the outer windows of several containers with the same shrinking windows.
+        """
+        items = [item for item in items if len(item) > 0]
+        if not items:
+            return cls.empty(0, 0)
+        return cls(
+            np.concatenate([item.fits for item in items]),
+            np.concatenate([item.t1 for item in items]),
+            np.concatenate([item.t2 for item in items]),
+            np.concatenate([item.p2 for item in items]),
+        )
+
+    def to_records(self):
+        """
+        Returns:
+            the legacy list of {"t1", "t2", "p2", "res"} dicts
+        """
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def shape(self):
+        return self.fits.shape
+
+    def __len__(self):
+        return self.fits.shape[0]
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"NestedFits index {idx} out of range")
+        row = self.fits[idx]
+        return {
+            "t1": self.t1[idx].item(),
+            "t2": self.t2[idx].item(),
+            "p2": self.p2[idx].item(),
+            "res": [dict(zip(FIT_FIELDS, fit.item())) for fit in row],
+        }
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
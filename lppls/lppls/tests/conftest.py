@@ -0,0 +1,12 @@
+from lppls import data_loader
+import pytest
+import numpy as np
+
+
+@pytest.fixture
+def observations():
+    # the first 100 log prices of the Nasdaq dot-com data, small enough for the nested fits to run fast
+    data = data_loader.nasdaq_dotcom().head(100)
+    time_ = np.linspace(0, len(data) - 1, len(data))
+    price = np.log(data['Adj Close'].values)
+    return np.array([time_, price])
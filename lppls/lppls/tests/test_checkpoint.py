@@ -0,0 +1,47 @@
+from lppls import checkpoint
+from lppls import nested_fits
+import os
+import pytest
+import numpy as np
+
+
+def _window(i):
+    fits = np.zeros(3, dtype=nested_fits.FIT_DTYPE)
+    fits['tc'] = np.arange(3.0) + i
+    return float(i), float(i + 9), 100.0 + i, fits
+
+
+@pytest.fixture
+def observations():
+    return np.array([np.arange(20.0), np.linspace(1.0, 2.0, 20)])
+
+
+def test_resume(tmp_path, observations):
+    path = str(tmp_path / 'run.npz')
+    ckpt = checkpoint.FitCheckpoint(path, every=2)
+    assert ckpt.open(observations, {'max_searches': 25}) == {}
+    ckpt.add(0, _window(0))
+    assert not os.path.exists(path)
+    ckpt.add(5, _window(5))
+    ckpt.add(10, _window(10))
+    # only the first two windows were written
+    done = checkpoint.FitCheckpoint(path).open(observations, {'max_searches': 25})
+    assert sorted(done) == [0, 5]
+    t1, t2, p2, fits = done[5]
+    assert (t1, t2, p2) == (5.0, 14.0, 105.0)
+    assert np.array_equal(fits, _window(5)[3])
+    ckpt.flush()
+    assert len(checkpoint.FitCheckpoint(path).open(observations, {'max_searches': 25})) == 3
+    ckpt.remove()
+    assert not os.path.exists(path)
+
+
+def test_other_run(tmp_path, observations):
+    path = str(tmp_path / 'run.npz')
+    ckpt = checkpoint.FitCheckpoint(path, every=1)
+    ckpt.open(observations, {'max_searches': 25})
+    ckpt.add(0, _window(0))
+    with pytest.raises(ValueError):
+        checkpoint.FitCheckpoint(path).open(observations, {'max_searches': 5})
+    with pytest.raises(ValueError):
+        checkpoint.FitCheckpoint(path).open(observations[:, 1:], {'max_searches': 25})
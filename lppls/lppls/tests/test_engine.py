@@ -0,0 +1,60 @@
+from lppls import engine
+from lppls import lppls
+import os
+import subprocess
+import sys
+import numpy as np
+
+
+def test_engine_multiple_models(observations):
+    models = [lppls.LPPLS(observations=observations), lppls.LPPLS(observations=observations[:, 10:])]
+    with engine.LPPLSEngine(workers=2) as lppls_engine:
+        res_1 = lppls_engine.compute_nested_fits(models[0], seeding='grid', result_format='array')
+        res_2 = lppls_engine.compute_nested_fits(models[1], seeding='grid', result_format='array', shared_memory=True)
+        res_3 = models[0].mp_compute_nested_fits(workers=None, engine=lppls_engine, seeding='grid')
+    assert res_1.shape == (5, 30)
+    assert res_2.shape == (3, 30)
+    assert res_2.t1[0] == 10.0
+    assert res_3[0]['res'][0]['tc'] == res_1.fits['tc'][0, 0]
+    # the results are kept on the models that were fitted
+    assert models[1].indicator_result is res_2
+
+
+def test__get_job_model(observations):
+    model = lppls.LPPLS(observations=observations)
+    state = model._get_worker_state()
+    assert 'observations' not in state
+    job = ('job-id', lppls.LPPLS, state, None)
+    worker_model = engine._get_job_model(job)
+    assert isinstance(worker_model, lppls.LPPLS)
+    assert engine._get_job_model(job) is worker_model
+
+
+def test_batch_compute_nested_fits(observations):
+    series = {'a': observations, 'b': lppls.LPPLS(observations=observations[:, 10:]), 'short': observations[:, :50]}
+    res = dict(lppls.LPPLS.batch_compute_nested_fits(series, workers=2, seeding='grid', result_format='array'))
+    assert set(res) == {'a', 'b', 'short'}
+    assert res['a'].shape == (5, 30)
+    assert res['b'].shape == (3, 30)
+    assert len(res['short']) == 0
+    assert series['b'].indicator_result is res['b']
+    expected = lppls.LPPLS(observations=observations).mp_compute_nested_fits(1, seeding='grid', result_format='array')
+    assert np.array_equal(res['a'].fits['tc'], expected.fits['tc'])
+
+
+def test__get_start_method():
+    # forked by default, started fresh once the parallel kernels have run in the process
+    code = (
+        "from lppls import engine, kernels; print(engine._get_start_method()); "
+        "kernels.warmup(parallel=True); print(engine._get_start_method())"
+    )
+    cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=cwd).stdout
+    assert out.split() == ['None', 'forkserver']
+
+
+def test__init_worker():
+    engine._init_worker(True)
+    # the model kernels are compiled along with the fit kernels
+    assert {signature[0].layout for signature in lppls.LPPLS.matrix_equation.signatures} >= {'C', 'A'}
+    assert lppls.LPPLS.lppls.signatures
@@ -0,0 +1,58 @@
+from lppls import fit_cache
+from lppls import nested_fits
+import os
+import numpy as np
+
+
+def _window(i):
+    fits = np.zeros(3, dtype=nested_fits.FIT_DTYPE)
+    fits['tc'] = np.arange(3.0) + i
+    return float(i), float(i + 9), 100.0 + i, fits
+
+
+def test_key():
+    obs = np.array([np.arange(10.0), np.linspace(1.0, 2.0, 10)])
+    settings = {'max_searches': 25, 'minimizer': 'Nelder-Mead'}
+    key = fit_cache.FitCache.key(obs, settings)
+    assert key == fit_cache.FitCache.key(obs.copy(), dict(settings))
+    assert key != fit_cache.FitCache.key(obs, dict(settings, max_searches=5))
+    changed = obs.copy()
+    changed[1, -1] += 1e-12
+    assert key != fit_cache.FitCache.key(changed, settings)
+
+
+def test_key_format_version(monkeypatch):
+    obs = np.array([np.arange(10.0), np.linspace(1.0, 2.0, 10)])
+    key = fit_cache.FitCache.key(obs, {})
+    monkeypatch.setattr(fit_cache.FitCache, 'FORMAT_VERSION', fit_cache.FitCache.FORMAT_VERSION + 1)
+    assert key != fit_cache.FitCache.key(obs, {})
+
+
+def test_get_put(tmp_path):
+    cache = fit_cache.FitCache(str(tmp_path))
+    assert cache.get('a') is None
+    cache.put('a', _window(1))
+    t1, t2, p2, fits = cache.get('a')
+    assert (t1, t2, p2) == (1.0, 10.0, 101.0)
+    assert np.array_equal(fits, _window(1)[3])
+    assert 'a' in cache
+    # entries persist across instances
+    assert len(fit_cache.FitCache(str(tmp_path))) == 1
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_eviction(tmp_path):
+    cache = fit_cache.FitCache(str(tmp_path))
+    cache.put('a', _window(0))
+    size = cache.nbytes
+    cache = fit_cache.FitCache(str(tmp_path), max_bytes=2 * size)
+    cache.put('b', _window(1))
+    # make 'b' the least recently used entry
+    cache.get('a')
+    os.utime(cache._path('b'), (0, 0))
+    cache.put('c', _window(2))
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.nbytes <= 2 * size
@@ -0,0 +1,188 @@
+from lppls import kernels
+from lppls import lppls
+import pytest
+import numpy as np
+
+
+def _reference_fit(observations, tc, m, w):
+    lin = lppls.LPPLS.matrix_equation(observations, tc, m, w)
+    a, b, c1, c2 = lin[:, 0].tolist()
+    fit = lppls.LPPLS.lppls(observations[0], tc, m, w, a, b, c1, c2)
+    return np.sum((fit - observations[1]) ** 2), a, b, c1, c2
+
+
+@pytest.mark.parametrize('tc, m, w', [(110.0, 0.3, 7.0), (130.5, 0.8, 12.0), (95.0, 0.5, 9.0)])
+def test_restricted_fit(observations, tc, m, w):
+    expected = _reference_fit(observations, tc, m, w)
+    actual = kernels.restricted_fit(observations, tc, m, w)
+    assert actual[0] == pytest.approx(expected[0], rel=1e-6, abs=1e-10)
+    assert np.allclose(actual[1:], expected[1:], rtol=1e-5, atol=1e-8)
+    assert kernels.restricted_sse(observations, tc, m, w) == actual[0]
+
+
+def test_restricted_fit_invalid(observations):
+    sse, a, b, c1, c2 = kernels.restricted_fit(observations, np.nan, 0.5, 9.0)
+    assert sse == np.inf
+    assert np.isnan(a)
+
+
+def test_evaluate_candidates(observations):
+    params = np.array([[110.0, 0.3, 7.0], [130.5, 0.8, 12.0], [np.nan, 0.5, 9.0]])
+    sse, lin = kernels.evaluate_candidates(observations, params)
+    assert sse.shape == (3,)
+    assert lin.shape == (3, 4)
+    for k in range(2):
+        expected = kernels.restricted_fit(observations, *params[k])
+        assert sse[k] == expected[0]
+        assert np.array_equal(lin[k], expected[1:])
+    assert sse[2] == np.inf
+
+
+def _reference_residuals(observations, x):
+    sse, a, b, c1, c2 = kernels.restricted_fit(observations, *x)
+    return lppls.LPPLS.lppls(observations[0], x[0], x[1], x[2], a, b, c1, c2) - observations[1]
+
+
+@pytest.mark.parametrize('x', [[110.0, 0.3, 7.0], [130.5, 0.8, 12.0], [90.3, 0.5, 9.0]])
+def test_restricted_derivatives(observations, x):
+    x = np.array(x)
+    sse, *grad = kernels.restricted_gradient(observations, *x)
+    residuals, jac = kernels.restricted_jacobian(observations, *x)
+    assert sse == kernels.restricted_sse(observations, *x)
+    assert np.allclose(residuals, _reference_residuals(observations, x), atol=1e-12)
+    assert np.allclose(kernels.restricted_residuals(observations, *x), residuals, atol=1e-12)
+
+    for k in range(3):
+        step = np.zeros(3)
+        step[k] = 1e-6 * max(1.0, abs(x[k]))
+        fd_grad = (kernels.restricted_sse(observations, *(x + step))
+                   - kernels.restricted_sse(observations, *(x - step))) / (2 * step[k])
+        fd_jac = (_reference_residuals(observations, x + step)
+                  - _reference_residuals(observations, x - step)) / (2 * step[k])
+        assert grad[k] == pytest.approx(fd_grad, rel=1e-4, abs=1e-8)
+        assert np.allclose(jac[:, k], fd_jac, atol=1e-7)
+    # variable projection: the SSE gradient is 2 J'r
+    assert np.allclose(grad, 2 * jac.T @ residuals)
+
+
+def _pinball(r, q):
+    return np.sum(np.where(r >= 0, q * r, (q - 1) * r))
+
+
+@pytest.mark.parametrize('q', [0.1, 0.5, 0.9])
+def test_quantile_fit(observations, q):
+    x = np.array([110.0, 0.3, 7.0])
+    loss, a, b, c1, c2 = kernels.quantile_fit(observations, *x, q)
+    r = observations[1] - lppls.LPPLS.lppls(observations[0], *x, a, b, c1, c2)
+    assert loss == pytest.approx(_pinball(r, q), rel=1e-8)
+    # about a fraction q of the observations lie below the quantile fit
+    assert abs((r < 0).mean() - q) < 0.05
+    # no worse than the least squares linear parameters
+    assert loss <= _pinball(-_reference_residuals(observations, x), q) + 1e-12
+    # the objective runs fewer iterations, it bounds the loss from above and gets close to it
+    assert loss <= kernels.quantile_loss(observations, *x, q) <= loss * 1.05
+    assert kernels.quantile_loss(observations, np.nan, 0.3, 7.0, q) == np.inf
+
+
+def test_quantile_fit_depends_on_q(observations):
+    x = np.array([110.0, 0.3, 7.0])
+    low, median, high = (kernels.quantile_fit(observations, *x, q) for q in (0.1, 0.5, 0.9))
+    fits = [lppls.LPPLS.lppls(observations[0], *x, *res[1:]) for res in (low, median, high)]
+    assert fits[0].mean() < fits[1].mean() < fits[2].mean()
+
+
+def test_evaluate_quantile_candidates(observations):
+    params = np.array([[110.0, 0.3, 7.0], [130.5, 0.8, 12.0], [np.nan, 0.5, 9.0]])
+    quantiles = np.array([0.1, 0.5, 0.9])
+    loss = kernels.evaluate_quantile_candidates(observations, params, quantiles)
+    assert loss.shape == (3, 3)
+    for k in range(2):
+        for j, q in enumerate(quantiles):
+            assert loss[k, j] == pytest.approx(kernels.quantile_loss(observations, *params[k], q), rel=1e-12)
+        assert len(set(loss[k])) == 3
+    assert (loss[2] == np.inf).all()
+
+
+def test_evaluate_chisquare_candidates(observations):
+    params = np.array([[110.0, 0.3, 7.0], [130.5, 0.8, 12.0], [np.nan, 0.5, 9.0]])
+    chi2 = kernels.evaluate_chisquare_candidates(observations, params)
+    for k in range(2):
+        fit = _reference_residuals(observations, params[k]) + observations[1]
+        expected = np.sum((fit - observations[1]) ** 2 / observations[1])
+        assert chi2[k] == pytest.approx(expected, rel=1e-8)
+    # failed linear solve: the model is 0 everywhere
+    assert chi2[2] == pytest.approx(np.sum(observations[1]), rel=1e-12)
+
+
+def test_nested_restricted_fit(observations):
+    tc, m, w = 110.0, 0.4, 8.0
+    starts = np.array([0, 10, 70, 40, 200, 99])
+    sse, lin = kernels.nested_restricted_fit(observations, tc, m, w, starts)
+    for k, j in enumerate(starts[:4]):
+        expected = kernels.restricted_fit(np.ascontiguousarray(observations[:, j:]), tc, m, w)
+        assert sse[k] == pytest.approx(expected[0], rel=1e-6, abs=1e-10)
+        assert np.allclose(lin[k], expected[1:], rtol=1e-5, atol=1e-8)
+    # out of range windows can't be solved
+    assert sse[4] == np.inf
+    assert np.isnan(lin[4]).all()
+
+    params = np.array([[tc, m, w], [130.0, 0.7, 11.0]])
+    batch_sse, batch_lin = kernels.evaluate_nested_candidates(observations, params, starts)
+    assert batch_sse.shape == (2, 6)
+    assert batch_lin.shape == (2, 6, 4)
+    assert np.array_equal(batch_sse[0], sse)
+
+
+def test_nelder_mead_bounded(observations):
+    x0 = np.array([110.0, 0.3, 7.0])
+    unbounded = np.full(3, np.inf)
+    x, fun, success = kernels.nelder_mead_bounded(observations, x0, -unbounded, unbounded)
+    assert success
+    assert np.array_equal(x, kernels.nelder_mead(observations, x0)[0])
+
+    lower = np.array([100.0, 0.1, 6.0])
+    upper = np.array([120.0, 0.9, 13.0])
+    x, fun, success = kernels.nelder_mead_bounded(observations, np.array([150.0, 0.3, 7.0]), lower, upper)
+    assert np.all((lower <= x) & (x <= upper))
+    assert fun == kernels.restricted_sse(observations, *x)
+
+
+def test_levenberg_marquardt(observations):
+    unbounded = np.full(3, np.inf)
+    x0 = np.array([110.0, 0.3, 7.0])
+    x, fun, success = kernels.levenberg_marquardt(observations, x0, -unbounded, unbounded)
+    assert success
+    assert fun == pytest.approx(kernels.restricted_sse(observations, *x))
+    assert fun < kernels.restricted_sse(observations, *x0)
+    # stationary point of the SSE
+    _, *grad = kernels.restricted_gradient(observations, *x)
+    assert np.max(np.abs(grad)) < 1e-3
+
+    lower = np.array([100.0, 0.1, 6.0])
+    upper = np.array([120.0, 0.9, 13.0])
+    x, fun, success = kernels.minimize_restricted(observations, x0, lower, upper, kernels.LEVENBERG_MARQUARDT)
+    assert np.all((lower <= x) & (x <= upper))
+
+
+def test_warmup_layouts(observations):
+    lppls.LPPLS.warmup()
+    compiled = (kernels.restricted_sse, kernels.evaluate_candidates, kernels.minimize_restricted,
+                lppls.LPPLS.matrix_equation)
+    for kernel in compiled:
+        layouts = {signature[0].layout for signature in kernel.signatures}
+        assert {'C', 'A'} <= layouts, kernel
+    # a fit on a window of the series reuses the compiled signature
+    n_signatures = len(kernels.restricted_sse.signatures)
+    kernels.restricted_sse(observations[:, 10:], 110.0, 0.3, 7.0)
+    assert len(kernels.restricted_sse.signatures) == n_signatures
+
+
+def test_warmup_parallel_signature(observations):
+    kernels.warmup(parallel=True)
+    n_signatures = len(kernels.nested_fits_parallel.signatures)
+    # the numba backend runs on the signature compiled by the warmup
+    lppls.LPPLS(observations).mp_compute_nested_fits(
+        window_size=30, smallest_window_size=20, outer_increment=20, inner_increment=5, max_searches=1, workers=1,
+        backend='numba'
+    )
+    assert len(kernels.nested_fits_parallel.signatures) == n_signatures
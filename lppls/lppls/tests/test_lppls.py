@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 
-import lppls
-import data_loader
+from lppls import lppls
+from lppls import data_loader
 import pytest
 import numpy as np
+import pandas as pd
+import os
+import subprocess
+import sys
+from lppls import fit_cache
+from lppls import checkpoint
 
 
 @pytest.fixture
@@ -155,4 +161,315 @@ def test__is_D_in_range(lppls_model):
     b = 1000
     c = 100
     D_min
-    assert lppls_model._is_D_in_range(m, w, b, c, D_min) == False
\ No newline at end of file
+    assert lppls_model._is_D_in_range(m, w, b, c, D_min) == False
+
+
+def test_evaluate_candidates(observations, lppls_model):
+    params = [[110.0, 0.3, 7.0], [130.5, 0.8, 12.0]]
+    sse, lin = lppls_model.evaluate_candidates(params)
+    assert lin.shape == (2, 4)
+    for k in range(2):
+        assert sse[k] == pytest.approx(lppls_model.func_restricted(np.array(params[k]), observations))
+
+
+@pytest.mark.parametrize('seeding', ['grid', 'sobol'])
+def test_fit_deterministic_seeding(lppls_model, seeding):
+    res_1 = lppls_model.fit(5, seeding=seeding)
+    res_2 = lppls_model.fit(5, seeding=seeding)
+    assert res_1 == res_2
+    assert res_1[0] != 0
+
+
+def test__get_seeds(observations, lppls_model):
+    init_limits = lppls_model._get_init_limits(observations)
+    seeds = lppls_model._get_seeds(observations, 3, 'grid', init_limits)
+    assert seeds.shape == (3, 3)
+    sse, _ = lppls_model.evaluate_candidates(seeds)
+    assert np.all(np.diff(sse) >= 0)
+    for seed in lppls_model._get_seeds(observations, 3, 'random', init_limits):
+        assert all(lo <= s <= hi for s, (lo, hi) in zip(seed, init_limits))
+    with pytest.raises(ValueError):
+        lppls_model._get_seeds(observations, 3, 'foo', init_limits)
+
+
+@pytest.mark.parametrize('minimizer', ['L-BFGS-B', 'BFGS', 'TNC', 'SLSQP', 'trust-constr'])
+def test_fit_gradient_minimizers(lppls_model, minimizer):
+    tc, m, w, a, b, c, c1, c2, O, D = lppls_model.fit(5, minimizer, seeding='grid')
+    assert tc != 0
+    if minimizer != 'BFGS':
+        bounds = lppls_model._get_search_bounds(lppls_model.observations)
+        assert all(lo <= x <= hi for x, (lo, hi) in zip((tc, m, w), bounds))
+    grad = lppls_model.func_restricted_grad(np.array([tc, m, w]), lppls_model.observations)
+    assert grad.shape == (3,)
+
+
+@pytest.mark.parametrize('minimizer', ['trust-ncg', 'newton-cg'])
+def test_fit_unbounded_hessian_minimizers(lppls_model, minimizer):
+    with pytest.raises(ValueError):
+        lppls_model.fit(5, minimizer)
+
+
+def test_fit_compiled_minimizers(lppls_model):
+    expected = lppls_model.fit(5, seeding='grid')
+    # the compiled simplex takes the same steps as scipy's Nelder-Mead
+    assert lppls_model.fit(5, 'numba-nelder-mead', seeding='grid') == pytest.approx(expected)
+    tc, *_ = lppls_model.fit(5, 'numba-lm', seeding='grid')
+    assert tc != 0
+
+
+def test_mp_compute_nested_fits_warm_start(observations, lppls_model):
+    res = lppls_model.mp_compute_nested_fits(workers=2, warm_start=True, minimizer='L-BFGS-B', seeding='grid')
+    assert len(res) == 5
+    assert [r['t2'] for r in res] == [79.0, 84.0, 89.0, 94.0, 99.0]
+    assert all(len(r['res']) == 30 for r in res)
+
+
+def test__get_nested_seeds(observations, lppls_model):
+    obs = observations[:, :80]
+    offsets = [0, 20, 40, 60]
+    seeds = lppls_model._get_nested_seeds(obs, offsets, 5, 'grid')
+    assert len(seeds) == len(offsets)
+    for j, window_seeds in zip(offsets, seeds):
+        window = obs[:, j:]
+        (tc_min, tc_max), _, _ = lppls_model._get_init_limits(window)
+        assert window_seeds.shape == (5, 3)
+        assert np.all((tc_min <= window_seeds[:, 0]) & (window_seeds[:, 0] <= tc_max))
+        # ranked by the objective of the window itself, best first
+        score = lppls_model._score_candidates(window, window_seeds)
+        assert np.all(np.diff(score) >= -1e-9 * score[0])
+    assert lppls_model._get_nested_seeds(obs, offsets, 5, 'random') is None
+
+
+def test__get_nested_fits_tasks_warm_start(lppls_model):
+    # the windows left after a resumed checkpoint, with gaps
+    starts = [0, 5, 10, 20, 25, 35]
+    tasks, _ = lppls_model._get_nested_fits_tasks(80, 20, 5, 2, 25, True, 'Nelder-Mead', 'grid', False, 1, starts)
+    chunks = [[args[2] for args in task[2]] for task in tasks]
+    assert [i for chunk in chunks for i in chunk] == starts
+    # a chunk warm starts each window from the previous one, it only holds neighbouring windows
+    assert all(np.all(np.diff(chunk) == 5) for chunk in chunks)
+
+
+def test_fit_seed(lppls_model):
+    tc, m, w, *_ = lppls_model.fit(5, seeding='grid')
+    # warm starting from a solution converges to the same point
+    res = lppls_model.fit(1, seed=[tc, m, w])
+    assert res[:3] == pytest.approx((tc, m, w), rel=1e-2)
+
+
+def test_mp_compute_nested_fits_array(observations, lppls_model):
+    res = lppls_model.mp_compute_nested_fits(workers=1, result_format='array')
+    assert res.shape == (5, 30)
+    assert res.t1[4] == 20.0
+    assert np.array_equal(res.fits['t2'][:, 0], [79.0, 84.0, 89.0, 94.0, 99.0])
+    assert np.array_equal(res.fits['t1'][0, :3], [0.0, 2.0, 4.0])
+    assert res[0]['res'][0].keys() == {'tc', 'm', 'w', 'a', 'b', 'c', 'c1', 'c2', 't1', 't2', 'O', 'D'}
+
+
+def test_compute_indicators_filter_conditions(lppls_model):
+    fit = {'tc': 105.0, 'm': 0.5, 'w': 8.0, 'a': 1.0, 'b': -1.0, 'c': 0.1, 'c1': 0.1, 'c2': 0.0,
+           't1': 0.0, 't2': 99.0, 'O': 3.0, 'D': 1.0}
+    res = [{'t1': 0.0, 't2': 99.0, 'p2': 1.0, 'res': [dict(fit), dict(fit, b=1.0), dict(fit, m=0.95)]}]
+
+    res_df = lppls_model.compute_indicators(res)
+    assert res_df['pos_conf'][0] == 1.0
+    assert res_df['neg_conf'][0] == 1.0
+    assert [f['is_qualified'] for f in res_df['_fits'][0]] == [True, True, True]
+
+    res_df = lppls_model.compute_indicators(res, {'m': (0.1, 0.9)})
+    assert res_df['pos_conf'][0] == 0.5
+    assert res_df['neg_conf'][0] == 1.0
+
+    res_df = lppls_model.compute_indicators(lppls.NestedFits.from_records(res), {'tc_after': 5})
+    assert res_df['pos_conf'][0] == 0.0
+    assert not res_df['_is_qualified'][0].any()
+
+    with pytest.raises(ValueError):
+        lppls_model.compute_indicators(res, {'foo': 1})
+
+
+def test_mp_compute_nested_fits_shared_memory(observations, lppls_model):
+    res = lppls_model.mp_compute_nested_fits(workers=1, shared_memory=True, seeding='grid', result_format='array')
+    expected = lppls_model.mp_compute_nested_fits(workers=1, seeding='grid', result_format='array')
+    for name in res.fits.dtype.names:
+        assert np.array_equal(res.fits[name], expected.fits[name], equal_nan=True)
+    res = lppls_model.mp_compute_nested_fits(workers=2, shared_memory=True, warm_start=True)
+    assert [r['t2'] for r in res] == [79.0, 84.0, 89.0, 94.0, 99.0]
+
+
+def test_mp_compute_nested_fits_cache(observations, lppls_model, tmp_path):
+    cache = fit_cache.FitCache(str(tmp_path))
+    res = lppls_model.mp_compute_nested_fits(workers=1, result_format='array', cache=cache)
+    assert len(cache) == 5
+    # random seeding: identical fits prove the windows were read back instead of fitted again
+    again = lppls_model.mp_compute_nested_fits(workers=1, result_format='array', cache=cache)
+    for name in res.fits.dtype.names:
+        assert np.array_equal(res.fits[name], again.fits[name], equal_nan=True)
+    assert np.array_equal(res.t2, again.t2)
+    # a new bar only adds the windows ending on it
+    extended = lppls.LPPLS(np.array([np.arange(105.0), np.append(observations[1], observations[1, -5:])]))
+    res = extended.mp_compute_nested_fits(workers=1, result_format='array', cache=cache)
+    assert len(cache) == 6
+    assert res.shape == (6, 30)
+    assert np.array_equal(res.fits['tc'][:5], again.fits['tc'])
+    with pytest.raises(ValueError):
+        lppls_model.mp_compute_nested_fits(workers=1, warm_start=True, cache=cache)
+
+
+def test__get_cache_settings(observations, lppls_model):
+    class LPPLS(lppls.LPPLS):
+        nested_fit_kwargs = {'max_iteration': 10}
+
+    args = (80, 20, 2, 25, 'Nelder-Mead', 'grid')
+    key = fit_cache.FitCache.key(observations, lppls_model._get_cache_settings(*args))
+    # a subclass of the same name, and its class level fit settings, get entries of their own
+    model = LPPLS(observations)
+    other = fit_cache.FitCache.key(observations, model._get_cache_settings(*args))
+    assert other != key
+    LPPLS.nested_fit_kwargs = {'max_iteration': 20}
+    assert fit_cache.FitCache.key(observations, model._get_cache_settings(*args)) not in (key, other)
+
+
+class _FailingLPPLS(lppls.LPPLS):
+    # start index of the outer window whose fit raises
+    fail_at = None
+
+    def _func_compute_nested_fits_array(self, args, seeds=None):
+        if args[2] == self.fail_at:
+            raise RuntimeError('window failed')
+        return super()._func_compute_nested_fits_array(args, seeds=seeds)
+
+    def _get_cache_settings(self, *args):
+        # the failure doesn't change the fits, keep the checkpoint of the failed run usable
+        settings = super()._get_cache_settings(*args)
+        settings['state'] = {k: v for k, v in settings['state'].items() if k != 'fail_at'}
+        return settings
+
+
+def test_mp_compute_nested_fits_checkpoint(observations, lppls_model, tmp_path):
+    expected = lppls_model.mp_compute_nested_fits(workers=1, seeding='grid', result_format='array')
+    path = str(tmp_path / 'run.npz')
+    ckpt = checkpoint.FitCheckpoint(path, every=1)
+    model = _FailingLPPLS(observations)
+    # an instance attribute, the workers rebuild the model from its state and don't see class attributes set here
+    model.fail_at = 10
+    with pytest.raises(RuntimeError):
+        model.mp_compute_nested_fits(workers=1, seeding='grid', result_format='array', checkpoint=ckpt)
+    model.fail_at = None
+    # the windows completed before the failure were kept
+    done = checkpoint.FitCheckpoint(path).open(observations, dict(
+        model._get_cache_settings(80, 20, 2, 25, 'Nelder-Mead', 'grid'), outer_increment=5, warm_start=False
+    ))
+    assert {0, 5} <= set(done) and 10 not in done
+
+    res = model.mp_compute_nested_fits(workers=1, seeding='grid', result_format='array', checkpoint=ckpt)
+    for name in expected.fits.dtype.names:
+        assert np.array_equal(res.fits[name], expected.fits[name], equal_nan=True)
+    assert np.array_equal(res.t2, expected.t2)
+    assert not (tmp_path / 'run.npz').exists()
+    with pytest.raises(ValueError):
+        lppls_model.mp_compute_nested_fits(workers=1, backend='numba', checkpoint=ckpt)
+
+
+def test_compute_nested_fits(observations, lppls_model):
+    res = lppls_model.compute_nested_fits(window_size=60, smallest_window_size=50, outer_increment=20,
+                                          inner_increment=4, max_searches=5, result_format='array')
+    assert res.shape == (3, 3, len(lppls.NESTED_FITS_PARAMS))
+    assert np.array_equal(res[:, 0, 0], [59.0, 79.0, 99.0])
+    assert np.array_equal(res[:, 0, 1], [0.0, 20.0, 40.0])
+    assert (res[..., 6] == 0).all()
+    parallel = lppls_model.compute_nested_fits(window_size=60, smallest_window_size=50, outer_increment=20,
+                                               inner_increment=4, max_searches=5, workers=2)
+    assert parallel.shape == res.shape
+    assert list(parallel.coords['t2'].values) == [59.0, 79.0, 99.0]
+    assert list(parallel.coords['windowsizes'].values) == [60, 56, 52]
+    assert np.array_equal(parallel.values[..., :2], res[..., :2])
+
+
+def test_detect_bubble_start_time_via_lagrange(observations, lppls_model):
+    for kwargs in ({}, {'workers': 2, 'warm_start': True}):
+        res = lppls_model.detect_bubble_start_time_via_lagrange(60, 40, step_size=5, max_searches=10, **kwargs)
+        assert set(res['window_sizes']) <= {60, 55, 50, 45, 40}
+        assert res['start_times'] == [40.0, 45.0, 50.0, 55.0, 60.0]
+        assert res['tau'] == observations[0][100 - res['optimal_window_size']]
+        # closed form regression of the normalized SSE on the window sizes
+        slope = np.polyfit(res['window_sizes'], res['ssen_list'], 1)[0]
+        expected = np.array(res['ssen_list']) - slope * np.array(res['window_sizes'])
+        assert np.allclose(res['lagrange_sse_list'], expected)
+        assert res['optimal_window_size'] == res['window_sizes'][np.argmin(expected)]
+
+
+def test_compute_bubble_start_times(observations, lppls_model):
+    res_df = lppls_model.compute_bubble_start_times(50, 30, step_size=10, max_searches=10, end_increment=10)
+    assert list(res_df['time']) == [49.0, 59.0, 69.0, 79.0, 89.0, 99.0]
+    assert list(res_df.columns[:4]) == ['time', 'price', 'tau', 'optimal_window_size']
+    fitted = res_df.dropna()
+    assert len(fitted) > 0
+    assert (fitted['tau'] == fitted['time'] + 1 - fitted['optimal_window_size']).all()
+    parallel = lppls_model.compute_bubble_start_times(50, 30, step_size=10, max_searches=10, end_increment=10,
+                                                      workers=2)
+    assert list(parallel['time']) == list(res_df['time'])
+    assert set(parallel['optimal_window_size'].dropna()) <= {50, 40, 30}
+
+
+def test_append(observations):
+    full = lppls.LPPLS(observations)
+    expected = full.mp_compute_nested_fits(workers=1, backend='numba', random_state=3, result_format='array')
+
+    model = lppls.LPPLS(observations[:, :95])
+    assert model.append(observations[:, 95:97]) is None
+    model = lppls.LPPLS(observations[:, :95])
+    res = model.mp_compute_nested_fits(workers=1, backend='numba', random_state=3, result_format='array')
+    res_df = model.compute_indicators(res)
+    assert model.indicators is res_df
+    assert len(model.append(observations[:, 95:97])) == 0
+    new = model.append(observations[:, 97:])
+    assert np.array_equal(new.t2, [99.0])
+    assert np.array_equal(model.observations, observations)
+    # only the new window was fitted, with the seed it gets in a full run
+    for name in expected.fits.dtype.names:
+        assert np.array_equal(model.indicator_result.fits[name], expected.fits[name], equal_nan=True)
+    pd.testing.assert_frame_equal(
+        model.indicators.drop(columns=['_fits', '_is_qualified']),
+        full.compute_indicators(expected).drop(columns=['_fits', '_is_qualified']),
+    )
+
+    model = lppls.LPPLS(observations[:, :95])
+    res = model.mp_compute_nested_fits(workers=1)
+    model.compute_indicators(res)
+    model.append(observations[:, 95:])
+    assert model.indicator_result is res
+    assert [r['t2'] for r in res] == [79.0, 84.0, 89.0, 94.0, 99.0]
+    assert len(model.indicators) == 5
+
+
+def test_mp_compute_nested_fits_numba(observations, lppls_model):
+    res = lppls_model.mp_compute_nested_fits(workers=2, backend='numba', random_state=1, result_format='array')
+    assert res.shape == (5, 30)
+    assert np.array_equal(res.t2, [79.0, 84.0, 89.0, 94.0, 99.0])
+    assert np.array_equal(res.fits['t1'][0, :3], [0.0, 2.0, 4.0])
+    assert (res.fits['tc'] != 0).any()
+    again = lppls.NestedFits.from_records(
+        lppls_model.mp_compute_nested_fits(workers=1, backend='numba', random_state=1)
+    )
+    for name in res.fits.dtype.names:
+        assert np.array_equal(res.fits[name], again.fits[name], equal_nan=True)
+    with pytest.raises(ValueError):
+        lppls_model.mp_compute_nested_fits(workers=1, backend='numba', minimizer='L-BFGS-B')
+    res = lppls_model.mp_compute_nested_fits(
+        workers=1, backend='numba', minimizer='numba-lm', random_state=1, result_format='array'
+    )
+    assert (res.fits['tc'] != 0).any()
+
+
+def test_warmup(lppls_model):
+    lppls.LPPLS.warmup()
+    # plotting, xarray and sklearn are only imported when used
+    code = (
+        "import sys; from lppls import lppls; print(hasattr(lppls, 'LPPLS'), "
+        "sorted({'matplotlib', 'xarray', 'sklearn'} & set(sys.modules)))"
+    )
+    # run from the repository root, where lppls is the package and not the module
+    cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=cwd).stdout
+    assert out.strip() == 'True []'
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from lppls import lppls
+import pytest
+import numpy as np
+
+pytest.importorskip('cma')
+from lppls import lppls_cmaes  # noqa: E402
+
+
+def _count_generations(monkeypatch):
+    generations = []
+    evaluate = lppls_cmaes.LPPLSCMAES._evaluate_population
+
+    def counting(obs, solutions, executor=None, workers=None):
+        generations.append(len(solutions))
+        return evaluate(obs, solutions, executor, workers)
+
+    monkeypatch.setattr(lppls_cmaes.LPPLSCMAES, '_evaluate_population', staticmethod(counting))
+    return generations
+
+
+def test_fit_stagnation(observations, monkeypatch):
+    generations = _count_generations(monkeypatch)
+    model = lppls_cmaes.LPPLSCMAES(observations)
+    # no generation improves on the first one by 100%, so the fit stops after stagnation_iterations more
+    tc, m, w, *_ = model.fit(max_iteration=1000, verbose=False, stagnation_iterations=3, stagnation_tol=1.0)
+    assert len(generations) == 4
+    assert tc >= observations[0, -1]
+
+
+def test_fit_quiet(observations, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    model = lppls_cmaes.LPPLSCMAES(observations)
+    tc, *_ = model.fit(max_iteration=5, verbose=False)
+    assert tc != 0
+    assert not list(tmp_path.glob('outcmaes*'))
+
+
+def test_compute_nested_fits(observations, monkeypatch):
+    generations = _count_generations(monkeypatch)
+    model = lppls_cmaes.LPPLSCMAES(observations)
+    model.nested_fit_kwargs = {'max_iteration': 3, 'pop_size': 1, 'verbose': False}
+    res = model.compute_nested_fits(window_size=60, smallest_window_size=50, outer_increment=20,
+                                    inner_increment=4, max_searches=5, result_format='array')
+    assert res.shape == (3, 3, len(lppls.NESTED_FITS_PARAMS))
+    assert (res[..., lppls.NESTED_FITS_PARAMS.index('tc')] != 0).all()
+    # every nested fit ran the iterations of nested_fit_kwargs (the loop runs iterations 0 to max_iteration),
+    # on the quiet compiled path
+    assert len(generations) == (3 + 1) * 9
+
+
+def test_detect_bubble_start_time_via_lagrange(observations):
+    model = lppls_cmaes.LPPLSCMAES(observations)
+    model.nested_fit_kwargs = {'max_iteration': 3, 'pop_size': 1, 'verbose': False}
+    for kwargs in ({}, {'warm_start': True}):
+        res = model.detect_bubble_start_time_via_lagrange(60, 40, step_size=10, **kwargs)
+        # every window was fitted
+        assert res['window_sizes'] == [60, 50, 40]
+        assert res['tau'] == observations[0][100 - res['optimal_window_size']]
+
+
+def test_fit_seed(observations, monkeypatch):
+    starts = []
+    strategy = lppls_cmaes.cm.CMAEvolutionStrategy
+
+    def recording(x0, *args, **kwargs):
+        starts.append(x0)
+        return strategy(x0, *args, **kwargs)
+
+    monkeypatch.setattr(lppls_cmaes.cm, 'CMAEvolutionStrategy', recording)
+    model = lppls_cmaes.LPPLSCMAES(observations)
+    model.fit(max_iteration=0, verbose=False, seed=[120.0, 0.3, 7.0])
+    # the search starts from the seed, clipped to the bounds
+    model.fit(max_iteration=0, verbose=False, seed=[50.0, 0.95, 7.0])
+    assert starts == [[120.0, 0.3, 7.0], [observations[0, -1], 0.9, 7.0]]
+
+
+def test_evaluate_population_threads(observations):
+    rng = np.random.default_rng(0)
+    solutions = list(np.column_stack((rng.uniform(100.0, 120.0, 37), rng.uniform(0.1, 0.9, 37),
+                                      rng.uniform(6.0, 13.0, 37))))
+    expected = lppls_cmaes.LPPLSCMAES._evaluate_population(observations, solutions)
+    assert len(expected) == 37
+    with ThreadPoolExecutor(3) as executor:
+        fitness = lppls_cmaes.LPPLSCMAES._evaluate_population(observations, solutions, executor, 3)
+    assert fitness == expected
+
+
+def test_fit_workers(observations):
+    model = lppls_cmaes.LPPLSCMAES(observations)
+    tc, m, w, a, b, c, c1, c2, O, D = model.fit(max_iteration=20, verbose=False, workers=2)
+    assert tc >= observations[0, -1]
+    assert 0.1 <= m <= 0.9 and 6.0 <= w <= 13.0
+    assert np.all(np.isfinite([a, b, c, c1, c2, O, D]))
+    assert model.coef_['tc'] == tc
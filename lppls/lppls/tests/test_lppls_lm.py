@@ -0,0 +1,46 @@
+from lppls import lppls_lm
+import pytest
+import numpy as np
+
+
+@pytest.mark.parametrize('x', [[120.0, 0.5, 9.0], [105.0, 0.3, 6.5], [150.0, 0.8, 12.0]])
+def test_func_restricted(observations, x):
+    model = lppls_lm.LPPLS_LM(observations)
+    a, b, c1, c2 = model.matrix_equation(observations, *x)[:, 0]
+    expected = model.lppls(observations[0], *x, a, b, c1, c2) - observations[1]
+    assert np.allclose(model.func_restricted(np.array(x), observations), expected)
+
+
+@pytest.mark.parametrize('x', [[120.0, 0.5, 9.0], [105.0, 0.3, 6.5], [150.0, 0.8, 12.0]])
+def test_jac_restricted(observations, x):
+    model = lppls_lm.LPPLS_LM(observations)
+    x = np.array(x)
+    jac = model.jac_restricted(x, observations)
+    assert jac.shape == (observations.shape[1], 3)
+    for i in range(3):
+        h = 1e-6 * abs(x[i])
+        step = np.zeros(3)
+        step[i] = h
+        forward = model.func_restricted(x + step, observations)
+        backward = model.func_restricted(x - step, observations)
+        assert np.allclose(jac[:, i], (forward - backward) / (2 * h), rtol=1e-4, atol=1e-6)
+
+
+def test_fit(observations):
+    model = lppls_lm.LPPLS_LM(observations)
+    tc, m, w, a, b, c, c1, c2, O, D = model.fit(5, seeding='grid')
+    assert tc != 0
+    assert model.coef_['tc'] == tc
+
+
+@pytest.mark.parametrize('warm_start', [False, True])
+def test_mp_compute_nested_fits(observations, warm_start):
+    model = lppls_lm.LPPLS_LM(observations)
+    res = model.mp_compute_nested_fits(
+        window_size=60, smallest_window_size=40, outer_increment=20, inner_increment=5, max_searches=3, workers=2,
+        warm_start=warm_start, seeding='grid', result_format='array'
+    )
+    assert np.array_equal(res.t2, [59.0, 79.0, 99.0])
+    assert res.fits.shape == (3, 4)
+    # every window found a solution
+    assert np.all(res.fits['tc'] != 0)
@@ -0,0 +1,19 @@
+from lppls import lppls_q
+import numpy as np
+
+
+def test_fit_quantiles(observations):
+    model = lppls_q.QLPPLS(observations, q=0.3)
+    res = model.fit_quantiles([0.9, 0.1, 0.5], max_searches=5)
+    assert sorted(res) == [0.1, 0.5, 0.9]
+    assert model.q == 0.3
+
+    fits = {}
+    for q, (tc, m, w, a, b, c, c1, c2, O, D) in res.items():
+        assert tc != 0
+        fits[q] = model.lppls(observations[0], tc, m, w, a, b, c1, c2)
+        # about a fraction q of the observations lie below the quantile fit
+        assert abs((observations[1] < fits[q]).mean() - q) < 0.1
+    assert not np.allclose(fits[0.1], fits[0.9])
+    # the outer quantiles bracket the median fit
+    assert fits[0.1].mean() < fits[0.5].mean() < fits[0.9].mean()
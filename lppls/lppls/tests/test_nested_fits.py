@@ -0,0 +1,46 @@
+from lppls import nested_fits
+import pytest
+import numpy as np
+
+
+@pytest.fixture
+def records():
+    return [
+        {
+            't1': float(i), 't2': float(i + 9), 'p2': 100.0 + i,
+            'res': [dict(zip(nested_fits.FIT_FIELDS, np.arange(12.0) + 100 * i + j)) for j in range(3)],
+        }
+        for i in range(4)
+    ]
+
+
+def test_from_records(records):
+    res = nested_fits.NestedFits.from_records(records)
+    assert res.shape == (4, 3)
+    assert len(res) == 4
+    assert res.fits['tc'][2, 1] == 201.0
+    assert res.fits['D'][3, 2] == 313.0
+    assert np.array_equal(res.t2, [9.0, 10.0, 11.0, 12.0])
+    assert res.to_records() == records
+    assert res[-1] == records[-1]
+    assert list(res) == records
+    with pytest.raises(IndexError):
+        res[4]
+
+
+def test_empty():
+    res = nested_fits.NestedFits.empty(2, 5)
+    assert res.shape == (2, 5)
+    assert np.isnan(res.fits['tc']).all()
+    assert len(nested_fits.NestedFits.from_records([])) == 0
+
+
+def test_concatenate(records):
+    res = nested_fits.NestedFits.from_records(records)
+    joined = nested_fits.NestedFits.concatenate([
+        nested_fits.NestedFits.from_records(records[:1]),
+        nested_fits.NestedFits.empty(0, 0),
+        nested_fits.NestedFits.from_records(records[1:]),
+    ])
+    assert joined.to_records() == res.to_records()
+    assert len(nested_fits.NestedFits.concatenate([])) == 0
@@ -0,0 +1,181 @@
+"""
+Benchmarks of the fitting kernels and of the nested-fit throughput.
+
+Runs offline on the bundled nasdaq_dotcom data and on synthetic LPPLS series, e.g.
+
+    python run_benchmarks.py --quick
+    python run_benchmarks.py --output baseline.json
+    python run_benchmarks.py --compare baseline.json --tolerance 0.25
+
+Every benchmark reports its median time per call, calls (or fits) per second and the peak memory allocated
+by this process while it ran (worker processes are not traced). With --compare the script exits with status 1
+if any benchmark got slower than the baseline by more than the tolerance, so it can gate dependency upgrades.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from lppls import data_loader, lppls, lppls_cmaes, lppls_lm, lppls_q
+
+
+def synthetic_observations(n_obs, seed=0):
+    """
+    Log prices of an LPPLS bubble with noise, critical time shortly after the last observation.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_obs, dtype=np.float64)
+    tc = n_obs * 1.05
+    price = lppls.LPPLS.lppls(t, tc, 0.5, 9.0, 8.0, -0.05, 0.005, 0.004)
+    return np.array([t, price + rng.normal(0.0, 0.005, n_obs)])
+
+
+def nasdaq_observations(n_obs):
+    data = data_loader.nasdaq_dotcom().head(n_obs)
+    t = np.arange(len(data), dtype=np.float64)
+    return np.array([t, np.log(data["Adj Close"].values)])
+
+
+def measure(func, repeat, work=1, warmup=True):
+    """
+    Args:
+        func (callable): the benchmarked call
+        repeat (int): number of timed calls
+        work (int): units of work (e.g. fits) done by one call
+        warmup (bool): run func once untimed first
+    Returns:
+        (dict) seconds (median per call), per_second (work per second) and peak_mib (peak memory allocated
+        by one more call, traced separately so tracing doesn't slow down the timed calls)
+    """
+    if warmup:
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = float(np.median(times))
+    return {
+        "seconds": seconds,
+        "per_second": work / seconds if seconds > 0 else float("inf"),
+        "peak_mib": peak / 2 ** 20,
+    }
+
+
+def kernel_benchmarks(quick):
+    repeat = 20 if quick else 200
+    for name, obs in (("nasdaq", nasdaq_observations(500)), ("synthetic", synthetic_observations(500))):
+        model = lppls.LPPLS(obs)
+        x = np.array([obs[0, -1] * 1.05, 0.5, 9.0])
+        yield f"lppls[{name}]", measure(
+            lambda: model.lppls(obs[0], x[0], x[1], x[2], 8.0, -0.05, 0.005, 0.004), repeat
+        )
+        yield f"matrix_equation[{name}]", measure(lambda: model.matrix_equation(obs, x[0], x[1], x[2]), repeat)
+        yield f"func_restricted[{name}]", measure(lambda: model.func_restricted(x, obs), repeat)
+        quantile_model = lppls_q.QLPPLS(obs, q=0.9)
+        yield f"func_restricted[QLPPLS,{name}]", measure(lambda: quantile_model.func_restricted(x, obs), repeat)
+
+
+def fit_benchmarks(quick):
+    repeat = 2 if quick else 10
+    max_searches = 5 if quick else 25
+    for data, obs in (("nasdaq", nasdaq_observations(200)), ("synthetic", synthetic_observations(200))):
+        models = {
+            "LPPLS[Nelder-Mead]": lambda: lppls.LPPLS(obs).fit(max_searches),
+            "LPPLS[L-BFGS-B]": lambda: lppls.LPPLS(obs).fit(max_searches, minimizer="L-BFGS-B"),
+            "LPPLS[numba-nelder-mead]": lambda: lppls.LPPLS(obs).fit(max_searches, minimizer="numba-nelder-mead"),
+            "LPPLS[numba-lm]": lambda: lppls.LPPLS(obs).fit(max_searches, minimizer="numba-lm"),
+            "LPPLS_LM": lambda: lppls_lm.LPPLS_LM(obs).fit(max_searches),
+            "QLPPLS": lambda: lppls_q.QLPPLS(obs, q=0.5).fit(max_searches),
+            "LPPLSCMAES": lambda: lppls_cmaes.LPPLSCMAES(obs).fit(
+                max_iteration=50 if quick else 500, verbose=False, stagnation_iterations=50
+            ),
+        }
+        for name, fit in models.items():
+            yield f"fit[{name},{data}]", measure(fit, repeat)
+
+
+def nested_fits_benchmarks(quick):
+    lengths = (200,) if quick else (200, 500, 1000)
+    worker_counts = (1, 2) if quick else sorted({1, 2, 4, os.cpu_count() or 1})
+    settings = dict(
+        window_size=120, smallest_window_size=30, outer_increment=10, inner_increment=10, max_searches=5
+    )
+    for n_obs in lengths:
+        n_fits = (
+            len(range(0, n_obs - settings["window_size"] + 1, settings["outer_increment"]))
+            * len(range(0, settings["window_size"] - settings["smallest_window_size"], settings["inner_increment"]))
+        )
+        for data, obs in (("nasdaq", nasdaq_observations(n_obs)), ("synthetic", synthetic_observations(n_obs))):
+            model = lppls.LPPLS(obs)
+            for workers in worker_counts:
+                for backend in ("process", "numba"):
+                    yield f"mp_compute_nested_fits[n={n_obs},workers={workers},{backend},{data}]", measure(
+                        lambda: model.mp_compute_nested_fits(
+                            workers=workers, backend=backend, result_format="array", **settings
+                        ),
+                        1,
+                        n_fits,
+                        warmup=False,
+                    )
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        (list) names of the benchmarks more than tolerance slower than in baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["seconds"] > baseline[name]["seconds"] * (1.0 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and sizes, for a smoke run")
+    parser.add_argument("--only", choices=("kernels", "fit", "nested"), help="run one group of benchmarks")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown, see --compare")
+    args = parser.parse_args(argv)
+
+    # compile (or load) the numba kernels so the first benchmark doesn't pay for it
+    lppls.LPPLS.warmup(parallel=True)
+
+    groups = {"kernels": kernel_benchmarks, "fit": fit_benchmarks, "nested": nested_fits_benchmarks}
+    results = {}
+    print(f"{'benchmark':<62} {'median s':>10} {'per second':>12} {'peak MiB':>10}")
+    for group, benchmarks in groups.items():
+        if args.only is not None and group != args.only:
+            continue
+        for name, result in benchmarks(args.quick):
+            results[name] = result
+            print(f"{name:<62} {result['seconds']:>10.4g} {result['per_second']:>12.4g} {result['peak_mib']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name in regressions:
+            print(f"REGRESSION {name}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())